@@ -1,33 +1,113 @@
 # app.py
-from ollama_helper import get_kosher_response
-from flask import Flask, render_template, request, session, redirect, flash, jsonify, url_for
-from models.database import database as db  # db הוא אינסטנס של Database()
+# ספריות כבדות (PIL, sendgrid, requests, ollama_helper) נטענות רק בשימוש הראשון
+from flask import Flask, Response, current_app, g, render_template, request, session, redirect, flash, jsonify, url_for
+from models.database import database as db, dumps_records, PoolTimeoutError  # db הוא אינסטנס של Database()
+from models.cart import create_cart_store
+from compression import compress_cached, init_compression
+from assets import init_assets
+from image_processing import ImageJobQueue, ImageStore, menu_picture, parse_variants, read_upload, variant_srcset
+import csv
+import hashlib
+import io
+import json
 import os
 from werkzeug.utils import secure_filename
-from PIL import Image
 import uuid
 from datetime import datetime
-import requests
-from flask import request, render_template
-from ollama_helper import ask_with_context
-from ollama_helper import get_kosher_response
 import re
-import os
-import sendgrid
-from sendgrid.helpers.mail import Mail
+import sqlite3
+import time
+import zlib
+
 
+# נתיבים ו-error handlers נאספים כאן ומחוברים לאפליקציה ב-create_app
+_routes = []
+_error_handlers = []
 
+def route(rule, **options):
+    """רישום נתיב - כמו app.route, לאפליקציה שתיווצר ב-create_app"""
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
 
-app = Flask(__name__)
-app.secret_key = 'roladin-secret-2025'
+def errorhandler(code):
+    """רישום error handler - כמו app.errorhandler"""
+    def decorator(handler):
+        _error_handlers.append((code, handler))
+        return handler
+    return decorator
 
 # פונקציות עזר
+# שדות המשתמש שנשמרים כ-claims בעוגיית ה-session (חתומה ע"י Flask, אבל קריאה ללקוח) -
+# רק מה שהאפליקציה צריכה: role להרשאות ו-username לתצוגה
+SESSION_CLAIMS = ('username', 'role')
+
+def set_session_user(user):
+    """שמירת המשתמש ב-session כ-claims, עם זמן האימות מול מסד הנתונים"""
+    session['user_id'] = user['id']
+    for key in SESSION_CLAIMS:
+        session[key] = user[key]
+    session.pop('email', None)  # עוגיות שנוצרו כש-email היה claim
+    session['claims_at'] = int(time.time())
+
 def get_current_user():
-    """קבלת המשתמש הנוכחי מה-session"""
+    """קבלת המשתמש הנוכחי - פעם אחת לבקשה (נשמר ב-g)
+
+    בדרך כלל נבנה מה-claims ב-session בלי שאילתה. אחרי SESSION_CLAIMS_TTL
+    שניות המשתמש נטען מחדש ממסד הנתונים, כך ששינוי תפקיד או השבתת משתמש
+    נכנסים לתוקף תוך זמן קצר.
+    """
+    if 'current_user' in g:
+        return g.current_user
+    
+    user = None
     user_id = session.get('user_id')
     if user_id:
-        return db.get_user_by_id(user_id)
-    return None
+        age = time.time() - session.get('claims_at', 0)
+        if age < current_app.config['SESSION_CLAIMS_TTL'] and all(key in session for key in SESSION_CLAIMS):
+            user = {'id': user_id}
+            user.update((key, session[key]) for key in SESSION_CLAIMS)
+        else:
+            user = db.get_user_by_id(user_id)
+            if user:
+                set_session_user(user)
+            else:
+                # המשתמש הושבת או נמחק
+                clear_session()
+    
+    g.current_user = user
+    return user
+
+def get_cart_store():
+    """מאגר העגלות של האפליקציה (נוצר ב-create_app לפי CART_STORE)"""
+    return current_app.extensions['cart_store']
+
+def get_cart_id(create=False):
+    """מזהה העגלה מה-session - רק המזהה נשמר בעוגייה, השורות בצד השרת"""
+    cart_id = session.get('cart_id')
+    if cart_id is None and create:
+        cart_id = session['cart_id'] = uuid.uuid4().hex
+        # עגלה חדשה - הזדמנות לנקות עגלות של sessions שפגו
+        get_cart_store().prune()
+    return cart_id
+
+def clear_session():
+    """ניקוי ה-session יחד עם העגלה שלו - אחרת היא נשארת יתומה בטבלאות"""
+    cart_id = session.get('cart_id')
+    if cart_id:
+        get_cart_store().clear(cart_id)
+    session.clear()
+
+def cart_context():
+    """מספר הפריטים בעגלה לתג בתפריט הניווט (context processor)"""
+    cart_id = get_cart_id()
+    count, _ = get_cart_store().summary(cart_id) if cart_id else (0, 0.0)
+    return {'cart_count': count}
+
+def get_cart_lines():
+    cart_id = get_cart_id()
+    return get_cart_store().lines(cart_id) if cart_id else []
 
 def require_login():
     """בדיקה שהמשתמש מחובר"""
@@ -57,7 +137,7 @@ def get_context_from_site(question):
 
     # בדיקה על עגלה
     elif "עגלה" in q or "cart" in q:
-        cart_items = session.get('cart', [])
+        cart_items = get_cart_lines()
         if cart_items:
             context = "בעגלה שלך יש: " + ", ".join([f"{c['name']} x{c['quantity']}" for c in cart_items])
         else:
@@ -67,7 +147,7 @@ def get_context_from_site(question):
     elif "הזמנה" in q or "order" in q:
         user = get_current_user()
         if user:
-            orders = db.get_orders_by_customer(user['id'])
+            orders = db.get_orders_by_customer(user['id'], limit=5)
             if orders:
                 context = "הזמנות קודמות: " + ", ".join(
                     [f"הזמנה #{o['order_number']} - {o['status']}" for o in orders]
@@ -85,44 +165,39 @@ UPLOAD_FOLDER = 'static/images/menu-items'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+def get_image_jobs():
+    """תור עבודות עיבוד התמונה (נוצר ב-create_app)"""
+    return current_app.extensions['image_jobs']
+
+def image_job_response(job):
+    """תשובת JSON למצב עבודת עיבוד תמונה"""
+    body = {
+        'success': True,
+        'job_id': job['id'],
+        'item_id': job['menu_item_id'],
+        'status': job['status'],
+        'status_url': url_for('api_image_job', job_id=job['id']),
+    }
+    if job['status'] == 'done':
+        body['image_url'] = url_for('static', filename=f"images/menu-items/{job['filename']}")
+        body['filename'] = job['filename']
+        item = db.get_menu_item_by_id(job['menu_item_id'])
+        variants = parse_variants(item['image_variants']) if item and item['image_filename'] == job['filename'] else None
+        if variants:
+            body['srcset'] = variant_srcset(job['filename'], variants, 'jpg')
+    elif job['status'] == 'failed':
+        body['error'] = job['error']
+    return body
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def create_unique_filename(original_filename):
-    """יצירת שם קובץ ייחודי"""
-    file_extension = original_filename.rsplit('.', 1)[1].lower()
-    unique_id = str(uuid.uuid4())[:8]
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    return f"{timestamp}_{unique_id}.{file_extension}"
-
-def optimize_image(image_path, max_width=800, max_height=600, quality=85):
-    """אופטימיזציה של תמונה"""
-    try:
-        with Image.open(image_path) as img:
-            # המרה ל-RGB אם צריך
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # שינוי גודל אם צריך
-            if img.width > max_width or img.height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-            
-            # שמירה עם דחיסה
-            img.save(image_path, 'JPEG', quality=quality, optimize=True)
-        return True
-    except Exception as e:
-        print(f"Error optimizing image: {e}")
-        return False
-
-# יצירת תיקיות
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs('static/images/general', exist_ok=True)
 
 def send_email(to_email, subject, content):
+    import sendgrid
+    from sendgrid.helpers.mail import Mail
+
     sg = sendgrid.SendGridAPIClient(api_key=os.environ.get("SENDGRID_API_KEY"))
     message = Mail(
         from_email="noreply@roladin.com",  # אפשר לשים מייל אמיתי שלך
@@ -140,7 +215,7 @@ def send_email(to_email, subject, content):
 
 
 # Routes בסיסיים
-@app.route('/')
+@route('/')
 def home():
     """עמוד הבית - הצגת תפריט וקטגוריות"""
     user = get_current_user()
@@ -152,7 +227,7 @@ def home():
                          menu_items=menu_items, 
                          categories=[{'category': cat} for cat in categories])
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     """התחברות למערכת"""
     if request.method == 'POST':
@@ -163,9 +238,7 @@ def login():
         
         if user:
             # שמירה ב-session
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['role'] = user['role']
+            set_session_user(user)
             
             # רישום פעילות
             db.log_activity(user['id'], 'login', f'User {username} logged in', request.remote_addr)
@@ -182,7 +255,7 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     """רישום משתמש חדש"""
     if request.method == 'POST':
@@ -198,9 +271,7 @@ def register():
         if user_id:
             # התחברות אוטומטית
             user = db.get_user_by_id(user_id)
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['role'] = user['role']
+            set_session_user(user)
             
             # רישום פעילות
             db.log_activity(user_id, 'register', f'New user {username} registered', request.remote_addr)
@@ -212,33 +283,26 @@ def register():
     
     return render_template('register.html')
 
-@app.route('/logout')
+@route('/logout')
 def logout():
     """התנתקות מהמערכת"""
     user_id = session.get('user_id')
     if user_id:
         db.log_activity(user_id, 'logout', 'User logged out', request.remote_addr)
     
-    session.clear()
+    clear_session()
     flash('התנתקת בהצלחה', 'info')
     return redirect('/')
 
-@app.route('/menu')
+@route('/menu')
 def menu():
     user = get_current_user()
     category = request.args.get('category')
     
-    menu_items = db.get_menu_items(category=category, available_only=True)
+    # רשומות קומפקטיות - created_at כבר מומר ל-datetime בשכבת מסד הנתונים
+    menu_items = db.get_menu_items(category=category, available_only=True, compact=True)
     categories = db.get_menu_categories()
 
-    # המרה של created_at ל-datetime
-    for item in menu_items:
-        if "created_at" in item and isinstance(item["created_at"], str):
-            try:
-                item["created_at"] = datetime.strptime(item["created_at"], "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                item["created_at"] = None
-
     return render_template(
         'menu.html',
         user=user,
@@ -252,7 +316,7 @@ def menu():
 # נתיבי ניהול תמונות
 # ========================
 
-@app.route('/upload_item_image', methods=['POST'])
+@route('/upload_item_image', methods=['POST'])
 def upload_item_image():
     """העלאת תמונה לפריט תפריט"""
     if not require_employee():
@@ -280,50 +344,31 @@ def upload_item_image():
         if not menu_item:
             return jsonify({'success': False, 'error': 'פריט לא נמצא'}), 404
         
-        # מחיקת תמונה קיימת אם יש
-        if menu_item.get('image_filename'):
-            old_image_path = os.path.join(app.config['UPLOAD_FOLDER'], menu_item['image_filename'])
-            if os.path.exists(old_image_path):
-                os.remove(old_image_path)
+        # בדיקת הכותרת (פורמט, מידות) לפני קריאת שאר הקובץ
+        try:
+            data, _, _ = read_upload(file.stream)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # שמירת התמונה החדשה
-        filename = create_unique_filename(file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        # אופטימיזציה של התמונה
-        if not optimize_image(file_path):
-            return jsonify({'success': False, 'error': 'שגיאה בעיבוד התמונה'}), 500
-        
-        # עדכון במסד הנתונים
-        success = db.update_menu_item_image(item_id, filename)
+        # עיבוד ועדכון מסד הנתונים ברקע; קובץ שכבר עובד מחובר מיד.
+        # התמונה הקודמת משוחררת רק כשהחדשה מחוברת לפריט
+        user = get_current_user()
+        job_id = get_image_jobs().submit(
+            menu_item['id'], data, user_id=user['id'], ip_address=request.remote_addr
+        )
         
-        if success:
-            # רישום פעילות
-            user = get_current_user()
-            db.log_activity(
-                user['id'], 
-                'image_upload', 
-                f'Image uploaded for menu item {item_id}', 
-                request.remote_addr
-            )
-            
-            return jsonify({
-                'success': True, 
-                'message': 'התמונה הועלתה בהצלחה',
-                'image_url': url_for('static', filename=f'images/menu-items/{filename}'),
-                'filename': filename
-            })
-        else:
-            # מחיקת הקובץ אם העדכון במסד הנתונים נכשל
-            os.remove(file_path)
-            return jsonify({'success': False, 'error': 'שגיאה בעדכון מסד הנתונים'}), 500
+        body = image_job_response(db.get_image_job(job_id))
+        if body['status'] == 'done':
+            body['message'] = 'התמונה הועלתה בהצלחה'
+            return jsonify(body)
+        body['message'] = 'התמונה התקבלה ומעובדת'
+        return jsonify(body), 202
             
     except Exception as e:
         print(f"Error uploading image: {e}")
         return jsonify({'success': False, 'error': 'שגיאה לא צפויה בהעלאת התמונה'}), 500
 
-@app.route('/delete_item_image/<int:item_id>', methods=['DELETE'])
+@route('/delete_item_image/<int:item_id>', methods=['DELETE'])
 def delete_item_image(item_id):
     """מחיקת תמונה של פריט תפריט"""
     if not require_employee():
@@ -339,13 +384,8 @@ def delete_item_image(item_id):
         if not image_filename:
             return jsonify({'success': False, 'error': 'לפריט אין תמונה'}), 400
         
-        # מחיקת הקובץ מהשרת
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        
-        # עדכון במסד הנתונים
-        success = db.update_menu_item_image(item_id, None)
+        # עדכון במסד הנתונים; הקבצים נמחקים אם אף פריט אחר לא משתמש בתמונה
+        success = get_image_jobs().store.detach(item_id)
         
         if success:
             # רישום פעילות
@@ -368,12 +408,11 @@ def delete_item_image(item_id):
         print(f"Error deleting image: {e}")
         return jsonify({'success': False, 'error': 'שגיאה לא צפויה במחיקת התמונה'}), 500
 
-@app.route('/api/cart-count')
+@route('/api/cart-count')
 def api_cart_count():
     """API לקבלת מספר פריטים בעגלה"""
-    cart_items = session.get('cart', [])
-    count = sum(item['quantity'] for item in cart_items)
-    total = sum(item['price'] * item['quantity'] for item in cart_items)
+    cart_id = get_cart_id()
+    count, total = get_cart_store().summary(cart_id) if cart_id else (0, 0.0)
     
     return jsonify({
         'count': count,
@@ -384,7 +423,7 @@ def api_cart_count():
 # שאר הנתיבים המקוריים
 # ========================
 
-@app.route('/add_to_cart', methods=['POST'])
+@route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     """הוספת פריט לעגלה"""
     if not require_login():
@@ -402,35 +441,13 @@ def add_to_cart():
         flash('פריט לא נמצא', 'error')
         return redirect('/menu')
     
-    # הוספה לעגלה ב-session
-    if 'cart' not in session:
-        session['cart'] = []
+    # הוספה לעגלה - פריט עם אותן בקשות מיוחדות מתאחד לשורה קיימת
+    get_cart_store().add(get_cart_id(create=True), menu_item, quantity, special_requests)
     
-    cart_item = {
-        'id': menu_item['id'],
-        'name': menu_item['name'],
-        'price': menu_item['price'],
-        'quantity': quantity,
-        'special_requests': special_requests
-    }
-    
-    # בדיקה אם הפריט כבר קיים בעגלה
-    found = False
-    for existing_item in session['cart']:
-        if (existing_item['id'] == item_id and 
-            existing_item['special_requests'] == special_requests):
-            existing_item['quantity'] += quantity
-            found = True
-            break
-    
-    if not found:
-        session['cart'].append(cart_item)
-    
-    session.modified = True
     flash(f'{menu_item["name"]} נוסף לעגלה', 'success')
     return redirect('/menu')
 
-@app.route('/cart')
+@route('/cart')
 def cart():
     """עגלת קניות"""
     if not require_login():
@@ -438,29 +455,27 @@ def cart():
         return redirect('/login')
     
     user = get_current_user()
-    cart_items = session.get('cart', [])
-    total = sum(item['price'] * item['quantity'] for item in cart_items)
+    cart_items = get_cart_lines()
+    _, total = get_cart_store().summary(get_cart_id()) if cart_items else (0, 0.0)
     
     return render_template('cart.html', 
                          user=user, 
                          cart_items=cart_items, 
                          total=total)
 
-@app.route('/remove_from_cart', methods=['POST'])
+@route('/remove_from_cart', methods=['POST'])
 def remove_from_cart():
     """הסרת פריט מהעגלה"""
-    item_index = int(request.form.get('item_index'))
-    cart = session.get('cart', [])
+    line_id = request.form.get('line_id', type=int)
+    cart_id = get_cart_id()
     
-    if 0 <= item_index < len(cart):
-        removed_item = cart.pop(item_index)
-        session['cart'] = cart
-        session.modified = True
+    removed_item = get_cart_store().remove(cart_id, line_id) if cart_id and line_id else None
+    if removed_item:
         flash(f'{removed_item["name"]} הוסר מהעגלה', 'info')
     
     return redirect('/cart')
 
-@app.route('/checkout', methods=['GET', 'POST'])
+@route('/checkout', methods=['GET', 'POST'])
 def checkout():
     """עמוד התשלום וביצוע ההזמנה"""
     if not require_login():
@@ -468,7 +483,7 @@ def checkout():
         return redirect('/login')
     
     user = get_current_user()
-    cart_items = session.get('cart', [])
+    cart_items = get_cart_lines()
     
     if not cart_items:
         flash('העגלה ריקה', 'warning')
@@ -481,52 +496,40 @@ def checkout():
         special_instructions = request.form.get('special_instructions', '')
         payment_method = request.form.get('payment_method', 'credit_card')
         
-        # יצירת הזמנה חדשה
-        order_id, order_number = db.create_order(
-            user['id'], 
-            delivery_address, 
-            delivery_phone, 
-            special_instructions
-        )
-        
-        # הוספת פריטים להזמנה
-        for item in cart_items:
-            db.add_order_item(
-                order_id, 
-                item['id'], 
-                item['quantity'], 
-                item['special_requests']
-            )
-        
-        # חישוב ועדכון סכום כולל
-        total_amount = db.update_order_total(order_id)
-        
-        # יצירת תשלום
+        # יצירת ההזמנה, הפריטים, התשלום והלוג בטרנזקציה אחת
         transaction_id = f"TXN{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        payment_id = db.create_payment(order_id, total_amount, payment_method, transaction_id)
-        
-        # עדכון סטטוס הזמנה לאושרה
-        db.update_order_status(order_id, 'confirmed')
-        
-        # רישום פעילות
-        db.log_activity(user['id'], 'order_created', f'Order {order_number} created', request.remote_addr)
-        
+        placed = db.place_order(
+            user['id'],
+            cart_items,
+            delivery_address,
+            delivery_phone,
+            special_instructions,
+            payment_method,
+            transaction_id,
+            request.remote_addr
+        )
+
+        if not placed:
+            flash('הפריטים בעגלה אינם זמינים יותר', 'error')
+            return redirect('/cart')
+
+        order_id, order_number, total_amount = placed
+
         # ניקוי עגלה
-        session.pop('cart', None)
-        session.modified = True
+        get_cart_store().clear(session.pop('cart_id'))
         
         flash(f'ההזמנה {order_number} נוצרה בהצלחה!', 'success')
         return redirect(f'/order/{order_id}')
     
-    # חישוב סכום לתצוגה
-    total = sum(item['price'] * item['quantity'] for item in cart_items)
+    # סכום לתצוגה
+    _, total = get_cart_store().summary(get_cart_id())
     
     return render_template('checkout.html', 
                          user=user, 
                          cart_items=cart_items, 
                          total=total)
 
-@app.route('/order/<int:order_id>')
+@route('/order/<int:order_id>')
 def order_details(order_id):
     """הצגת פרטי הזמנה"""
     if not require_login():
@@ -550,7 +553,7 @@ def order_details(order_id):
                          order=order, 
                          order_items=order['items'])
 
-@app.route('/my_orders')
+@route('/my_orders')
 def my_orders():
     """הזמנות הלקוח"""
     if not require_login():
@@ -558,11 +561,11 @@ def my_orders():
         return redirect('/login')
     
     user = get_current_user()
-    orders = db.get_orders_by_customer(user['id'])
+    orders, next_cursor = db.get_customer_orders_page(user['id'], cursor=request.args.get('cursor'), compact=True)
     
-    return render_template('my_orders.html', user=user, orders=orders)
+    return render_template('my_orders.html', user=user, orders=orders, next_cursor=next_cursor)
 
-@app.route('/dashboard')
+@route('/dashboard')
 def dashboard():
     """דשבורד עובדים"""
     if not require_employee():
@@ -573,22 +576,157 @@ def dashboard():
     stats = db.get_today_stats()
     
     # קבלת הזמנות אחרונות
-    conn = db.get_connection()
-    recent_orders = conn.execute('''
-        SELECT o.*, u.username 
-        FROM orders o 
-        JOIN users u ON o.customer_id = u.id 
-        ORDER BY o.created_at DESC 
-        LIMIT 10
-    ''').fetchall()
-    conn.close()
+    recent_orders, _ = db.get_recent_orders(limit=10)
     
     return render_template('dashboard.html', 
                          user=user, 
                          stats=stats, 
-                         recent_orders=[dict(order) for order in recent_orders])
+                         recent_orders=recent_orders)
+
+@route('/api/orders/recent')
+def api_recent_orders():
+    """הזמנות אחרונות לדשבורד - מלא בלי since, אחרת רק מה שהשתנה מאז ה-cursor"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    since = request.args.get('since')
+    if not since:
+        # ה-cursor נלקח לפני השאילתה - שינוי שיקרה ביניהן יגיע שוב בבדיקה הבאה
+        cursor = db.get_orders_sync_cursor()
+        orders, _ = db.get_recent_orders(limit=10)
+        return jsonify({'success': True, 'full': True, 'orders': orders, 'cursor': cursor})
+    
+    try:
+        orders, cursor = db.get_orders_changed_since(since)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'cursor לא תקין'}), 400
+    
+    return jsonify({'success': True, 'full': False, 'orders': orders, 'cursor': cursor})
+
+@route('/api/stream/orders')
+def stream_orders():
+    """ערוץ SSE לאירועי הזמנות - עובדים מקבלים הכל, לקוח רק את ההזמנות שלו
+
+    חיבור פתוח לכל מנוי: ב-production רץ על workers של gevent (gunicorn.conf.py),
+    אחרת כל דף פתוח תופס worker שלם.
+    """
+    if not require_login():
+        return jsonify({'success': False, 'message': 'יש להתחבר'}), 403
+    
+    user = get_current_user()
+    is_employee = user['role'] == 'employee'
+    user_id = user['id']
+    hub = db.events
+    heartbeat = current_app.config['SSE_HEARTBEAT_INTERVAL']
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    def generate():
+        # הגנרטור רץ אחרי סיום הבקשה - לא ניגש ל-session; למסד רק דרך hub,
+        # בחיבור קצר לכל שאילתה
+        yield 'retry: 3000\n\n'
+        seq, resume = None, True
+        while True:
+            try:
+                if resume:
+                    resume = False
+                    seq = hub.resolve(last_event_id)
+                if seq is None:
+                    # אי אפשר להמשיך מה-Last-Event-ID - הלקוח צריך לטעון מחדש
+                    seq = hub.last_seq
+                    yield 'event: resync\ndata: {}\n\n'
+                
+                events = hub.wait(seq, timeout=heartbeat)
+            except (sqlite3.Error, PoolTimeoutError) as e:
+                # המסד לא זמין כרגע - החיבור נשאר פתוח, וכשהמסד חוזר הלקוח מקבל resync
+                print(f"Error in order stream: {e}")
+                seq = None
+                yield ': retry\n\n'
+                time.sleep(3)
+                continue
+            if events is None:
+                seq = None
+                continue
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+            
+            for event in events:
+                seq = event['seq']
+                if is_employee or event['customer_id'] == user_id:
+                    data = json.dumps({k: v for k, v in event.items() if k != 'seq'}, ensure_ascii=False)
+                    yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+    
+    # חיבור הבקשה חוזר למאגר לפני הזרימה - המנוי לא מחזיק חיבור לכל חייו
+    db.teardown()
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@route('/api/reports/export')
+def api_reports_export():
+    """ייצוא דוח הזמנות בזרימה: ?format=csv|jsonl&from=YYYY-MM-DD&to=YYYY-MM-DD&gzip=1"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    report_format = request.args.get('format', 'csv')
+    if report_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'פורמט לא נתמך'}), 400
+    
+    dates = {}
+    for key in ('from', 'to'):
+        value = request.args.get(key)
+        if value:
+            try:
+                dates[key] = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+            except ValueError:
+                return jsonify({'success': False, 'message': f'תאריך לא תקין: {key}'}), 400
+    
+    compress = request.args.get('gzip') == '1'
+    columns = db.REPORT_COLUMNS
+    chunks = db.iter_order_report(dates.get('from'), dates.get('to'))
+    
+    def encode():
+        if report_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # BOM כדי ש-Excel יזהה UTF-8 (עברית)
+            buffer.write('\ufeff')
+            writer.writerow(columns)
+            for rows in chunks:
+                writer.writerows(rows)
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue().encode('utf-8')
+        else:
+            for rows in chunks:
+                yield ''.join(
+                    json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in rows
+                ).encode('utf-8')
+    
+    def gzipped(parts):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> פורמט gzip
+        for part in parts:
+            data = compressor.compress(part)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    filename = f"roladin_report_{datetime.now().strftime('%Y-%m-%d')}.{report_format}"
+    mimetype = 'text/csv' if report_format == 'csv' else 'application/x-ndjson'
+    body = encode()
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+        body = gzipped(body)
+    
+    return Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+    })
 
-@app.route('/update_order_status', methods=['POST'])
+@route('/update_order_status', methods=['POST'])
 def update_order_status():
     """עדכון סטטוס הזמנה - עובדים בלבד"""
     if not require_employee():
@@ -620,26 +758,205 @@ def update_order_status():
         })
 
 # API Routes
-@app.route('/api/menu')
+
+# תשובות JSON של התפריט, מקודדות מראש - עותק אחד לכל קטגוריה/פריט לכל גרסת תפריט,
+# יחד עם הגרסאות הדחוסות שלו
+_menu_json_cache = {'version': None, 'entries': {}}
+
+def menu_json_entry(body):
+    return {'body': body, 'etag': hashlib.sha256(body).hexdigest()[:32], 'encoded': {}}
+
+def cached_menu_json(key, build):
+    """רשומת מטמון לתשובת תפריט - נבנית רק פעם אחת לכל גרסת תפריט
+
+    build מחזיר את ה-JSON, או None אם אין מה להחזיר (לא נשמר במטמון).
+    """
+    version = db.get_menu_version()
+    if _menu_json_cache['version'] != version:
+        _menu_json_cache['version'] = version
+        _menu_json_cache['entries'] = {}
+
+    entries = _menu_json_cache['entries']
+    cached = entries.get(key)
+    if cached is None:
+        body = build()
+        if body is None:
+            return None
+        cached = entries[key] = menu_json_entry(body.encode('utf-8'))
+    return cached
+
+def menu_json_response(entry):
+    """תשובה עם ETag חזק ו-Cache-Control; 304 אם ללקוח כבר יש את הגרסה"""
+    # השוואה חלשה - אחרי דחיסה ה-ETag נשלח כ-W/"..."
+    if request.if_none_match.contains_weak(entry['etag']):
+        response = Response(status=304)
+        response.set_etag(entry['etag'])
+    else:
+        # הגוף הדחוס נשמר ברשומה - compress_response מדלג על תשובה עם Content-Encoding
+        body, encoding = compress_cached(entry['body'], entry['encoded'])
+        response = Response(body, mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        response.set_etag(entry['etag'], weak=encoding is not None)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['MENU_API_MAX_AGE']}"
+    return response
+
+@route('/api/menu')
 def api_menu():
     """API לקבלת תפריט"""
     category = request.args.get('category')
-    menu_items = db.get_menu_items(category=category, available_only=True)
-    return jsonify(menu_items)
+    if category and category not in db.get_menu_categories():
+        # קטגוריה לא קיימת - תשובה ריקה, בלי להוסיף מפתח למטמון
+        return menu_json_response(menu_json_entry(b'[]'))
 
-@app.route('/api/menu/<int:item_id>')
+    return menu_json_response(cached_menu_json(('category', category), lambda: dumps_records(
+        db.get_menu_items(category=category, available_only=True, compact=True)
+    )))
+
+@route('/api/menu/<int:item_id>')
 def api_menu_item(item_id):
-    """API לקבלת פריט ספציפי"""
-    item = db.get_menu_item_by_id(item_id)
-    if item:
-        return jsonify(item)
+    """API לקבלת פריט ספציפי - הפריט נשלף רק כשאין לו רשומה בגרסת התפריט הנוכחית"""
+    def build():
+        item = db.get_menu_item_by_id(item_id, compact=True)
+        return dumps_records([item])[1:-1] if item else None
+
+    entry = cached_menu_json(('item', item_id), build)
+    if entry:
+        return menu_json_response(entry)
     else:
         return jsonify({'error': 'Item not found'}), 404
+
+@route('/api/menu/add', methods=['POST'])
+def api_menu_add():
+    """הוספת פריט תפריט מהדשבורד (טופס, עם תמונה אופציונלית)"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    name = (request.form.get('name') or '').strip()
+    description = request.form.get('description', '')
+    category = (request.form.get('category') or '').strip()
+    try:
+        price = float(request.form.get('price', ''))
+    except ValueError:
+        price = None
+    
+    if not name or not category or price is None or price < 0:
+        return jsonify({'success': False, 'message': 'יש למלא שם, קטגוריה ומחיר תקין'}), 400
+    
+    data = None
+    file = request.files.get('image')
+    if file and file.filename:
+        if not allowed_file(file.filename):
+            return jsonify({'success': False, 'message': 'סוג קובץ לא נתמך. השתמש ב-JPG, PNG, GIF או WebP'}), 400
+        try:
+            data, _, _ = read_upload(file.stream)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+    item_id = db.add_menu_item(name, description, price, category, None)
+    
+    user = get_current_user()
+    db.log_activity(user['id'], 'menu_item_add', f'Menu item {item_id} added', request.remote_addr)
+    
+    body = {'success': True, 'item_id': item_id}
+    if data:
+        # התמונה מחוברת לפריט כשהעיבוד ברקע מסתיים
+        job_id = get_image_jobs().submit(item_id, data, user_id=user['id'], ip_address=request.remote_addr)
+        body['image_job'] = image_job_response(db.get_image_job(job_id))
+    
+    return jsonify(body)
+
+@route('/api/image-jobs/<job_id>')
+def api_image_job(job_id):
+    """מצב עבודת עיבוד תמונה: pending / processing / done / failed"""
+    if not require_employee():
+        return jsonify({'success': False, 'error': 'אין הרשאה'}), 403
+    
+    job = get_image_jobs().status(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'עבודה לא נמצאה'}), 404
+    return jsonify(image_job_response(job))
+
+@route('/api/menu/bulk-toggle', methods=['POST'])
+def api_menu_bulk_toggle():
+    """הפיכת פריטים לזמינים/לא זמינים - כל התפריט, או ids מסוימים"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    if 'available' not in data:
+        return jsonify({'success': False, 'message': 'חסר שדה available'}), 400
+    if data.get('ids') is not None and not isinstance(data['ids'], list):
+        return jsonify({'success': False, 'message': 'רשימת ids לא תקינה'}), 400
+    
+    try:
+        updated = db.bulk_set_availability(bool(data['available']), data.get('ids'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'רשימת ids לא תקינה'}), 400
+    
+    user = get_current_user()
+    db.log_activity(user['id'], 'menu_bulk_toggle', f'{updated} menu items set available={bool(data["available"])}', request.remote_addr)
+    
+    return jsonify({'success': True, 'updated': updated})
+
+@route('/api/menu/bulk-update', methods=['POST'])
+def api_menu_bulk_update():
+    """עריכה מרוכזת: {"items": [{"id": 1, "price": 20, "category": "...", "is_available": true}, ...]}"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    edits = data.get('items')
+    if not isinstance(edits, list) or not edits:
+        return jsonify({'success': False, 'message': 'חסרה רשימת items'}), 400
+    
+    try:
+        updated = db.bulk_edit_menu_items(edits)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'נתוני עריכה לא תקינים'}), 400
     
-@app.route("/ai_agent", methods=["GET", "POST"])
+    user = get_current_user()
+    db.log_activity(user['id'], 'menu_bulk_update', f'{updated} menu item updates', request.remote_addr)
+    
+    return jsonify({'success': True, 'updated': updated})
+    
+@route('/api/menu/stats')
+def api_menu_stats():
+    """סטטיסטיקות תפריט לדשבורד - מסיכומים שמתעדכנים בטריגרים ובמטמון התפריט"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    stats = db.get_menu_stats()
+    top = max(1, min(request.args.get('top', 5, type=int), 50))
+    return jsonify({
+        'success': True,
+        'total': stats['total'],
+        'available': stats['available'],
+        'unavailable': stats['unavailable'],
+        'categories': stats['categories'],
+        'best_sellers': db.get_best_sellers(limit=top),
+    })
+
+@route('/api/menu/recent')
+def api_menu_recent():
+    """פריטי תפריט שעודכנו לאחרונה"""
+    if not require_employee():
+        return jsonify({'success': False, 'message': 'אין הרשאה'}), 403
+    
+    limit = max(1, min(request.args.get('limit', 5, type=int), 50))
+    items = db.get_recent_menu_items(limit=limit)
+    return jsonify({'success': True, 'items': [
+        {key: item[key] for key in ('id', 'name', 'category', 'price', 'is_available', 'updated_at')}
+        for item in items
+    ]})
+
+@route("/ai_agent", methods=["GET", "POST"])
 def ai_agent():
     answer = None
     if request.method == "POST":
+        from ollama_helper import get_kosher_response
+
         user_question = request.form.get("question")
 
         # כאן פרומפט בסיסי – אחר כך נחבר ל־DB
@@ -653,27 +970,29 @@ def ai_agent():
     return render_template("ai_agent.html", answer=answer)
 
 # Error Handlers
-@app.errorhandler(404)
+@errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@errorhandler(500)
 def internal_error(error):
     return render_template('500.html'), 500
 
-@app.errorhandler(413)
+@errorhandler(413)
 def too_large(error):
     return jsonify({'success': False, 'error': 'הקובץ גדול מדי. הגודל המקסימלי הוא 5MB'}), 413
 
 
 
-@app.route('/ai_helper', methods=['GET', 'POST'])
+@route('/ai_helper', methods=['GET', 'POST'])
 def ai_helper():
     """מסך העוזר החכם"""
     user = get_current_user()
     question, answer = None, None
 
     if request.method == 'POST':
+        from ollama_helper import get_kosher_response
+
         question = request.form.get('question')
 
         # כאן ניתן להוסיף הקשר מהאתר
@@ -692,13 +1011,15 @@ def ai_helper():
 
 
 
-@app.route('/ask_ai', methods=['POST'])
+@route('/ask_ai', methods=['POST'])
 def ask_ai():
     """
     שליחת שאלה לעוזר החכם:
     - קודם ננסה לענות מתוך המערכת (DB/Session)
     - אם לא, נפנה ל-Ollama (LLM)
     """
+    import requests
+
     data = request.get_json(force=True)
     question = (data.get("question") or "").strip()
     norm_q = normalize_text(question)  # מנקה את השאלה
@@ -733,23 +1054,22 @@ def ask_ai():
 
         # עגלה
         elif "עגלה" in norm_q:
-            cart = session.get("cart", [])
+            cart = get_cart_lines()
             if not cart:
                 answer_from_db = "העגלה שלך כרגע ריקה."
             else:
                 items = [f'{c["name"]} (x{c["quantity"]})' for c in cart]
-                total = sum(c["price"] * c["quantity"] for c in cart)
+                _, total = get_cart_store().summary(get_cart_id())
                 answer_from_db = "בעגלה שלך יש: " + ", ".join(items) + f". סה\"כ משוער: ₪{total:.2f}"
 
         # הזמנות שלי
         elif any(k in norm_q for k in ["הזמנה", "הזמנות", "מספר הזמנה", "סטטוס הזמנה"]):
             if require_login():
                 user = get_current_user()
-                orders = db.get_orders_by_customer(user["id"])
-                if not orders:
+                latest = db.get_latest_order(user["id"])
+                if not latest:
                     answer_from_db = "לא נמצאו הזמנות קודמות שלך."
                 else:
-                    latest = orders[0]
                     answer_from_db = (
                         f'ההזמנה האחרונה שלך: #{latest["order_number"]} '
                         f'בסכום ₪{latest["total_amount"]:.2f}, סטטוס: {latest["status"]}.'
@@ -786,6 +1106,48 @@ def ask_ai():
         print("❌ שגיאה בשרת:", e)
         return jsonify({"ok": False, "answer": "אירעה שגיאה בעת יצירת התשובה."}), 500
 
+def create_app(config=None):
+    """יצירת אפליקציית Flask - אתחול מסד הנתונים מפורש, כאן ולא בזמן import"""
+    app = Flask(__name__)
+    app.secret_key = 'roladin-secret-2025'
+    # תחת gevent כל בקשה פתוחה מחזיקה חיבור עד סופה - gunicorn.conf.py מגדיל
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+    app.config['MENU_API_MAX_AGE'] = 60
+    app.config['SSE_HEARTBEAT_INTERVAL'] = 15
+    app.config['ORDER_EVENTS_POLL_INTERVAL'] = 1.0  # בדיקת אירועים מ-workers אחרים
+    app.config['SESSION_CLAIMS_TTL'] = 300
+    app.config['CART_STORE'] = 'sqlite'  # או 'memory' לתהליך יחיד
+    app.config['CART_MAX_AGE'] = 7 * 24 * 3600  # עגלה שלא נגעו בה שבוע נמחקת
+    app.config['IMAGE_WORKERS'] = 2
+    if config:
+        app.config.update(config)
+
+    # חיבור מסד הנתונים למחזור החיים של האפליקציה והרצת מיגרציות
+    db.init_app(app)
+    app.extensions['cart_store'] = create_cart_store(app.config['CART_STORE'], db, max_age=app.config['CART_MAX_AGE'])
+    app.extensions['image_jobs'] = ImageJobQueue(
+        db, ImageStore(db, app.config['UPLOAD_FOLDER']), max_workers=app.config['IMAGE_WORKERS']
+    )
+    # דחיסת תשובות וקבצים סטטיים דחוסים מראש (python compression.py)
+    init_compression(app)
+    # חבילות JS/CSS עם hash (python assets.py) ו-asset_tags() בתבניות
+    init_assets(app)
+    app.jinja_env.globals['menu_picture'] = menu_picture
+    app.context_processor(cart_context)
+
+    # יצירת תיקיות
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs('static/images/general', exist_ok=True)
+
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    for code, handler in _error_handlers:
+        app.register_error_handler(code, handler)
+
+    return app
+
 if __name__ == '__main__':
     print("🚀 מתחיל את מסעדת רולדין...")
     print("📊 יוצר מסד נתונים ונתונים לדוגמה...")
@@ -797,7 +1159,7 @@ if __name__ == '__main__':
     except ImportError:
         print("⚠️  PIL לא זמין - התקן עם: pip install Pillow")
     
-    # אתחול מסד הנתונים יקרה אוטומטית כשנייבא את database.py
+    app = create_app()
     
     print("✅ המערכת מוכנה!")
     print("🌐 כתובת: http://localhost:5000")
@@ -0,0 +1,291 @@
+# assets.py
+"""צינור קבצים סטטיים: איחוד לחבילה לכל עמוד, מיזעור ושם קובץ עם hash
+
+החבילות נכתבות ל-static/dist בשם <שם>.<hash>.<סיומת>, יחד עם manifest.json
+שממפה שם לוגי (למשל 'menu.js') לקובץ. בתבניות:
+
+    {{ asset_tags('menu.css') }}   ->  <link rel="stylesheet" href="/static/dist/menu.3f2a9c1b7e.css">
+
+הקבצים ב-dist לא משתנים לעולם (שינוי בתוכן = שם חדש), לכן מוגשים עם
+Cache-Control: immutable לשנה - חוץ מ-manifest.json, שמוגש עם no-cache. בלי בנייה (פיתוח) התבניות מקבלות את קבצי
+המקור עצמם, כל אחד בתגית משלו.
+
+בנייה:
+    python assets.py          או          flask --app app build-assets
+"""
+import hashlib
+import json
+import os
+import re
+
+from flask import current_app, request, url_for
+from markupsafe import Markup
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# קבצים שהשם שלהם נגזר מהתוכן: חבילות ב-dist ותמונות ממאגר התמונות.
+# manifest.json ב-dist נכתב מחדש בכל בנייה באותו שם - לא נכלל
+IMMUTABLE_PATHS = re.compile(r'^(dist/(?!manifest\.json)|images/menu-items/[0-9a-f]{16}(-\d+)?\.(jpg|webp)$)')
+
+# חבילה לכל עמוד - לפי סדר הטעינה בתבניות
+BUNDLES = {
+    'home.css': ['css/base.css', 'css/home.css'],
+    'home.js': ['js/base.js', 'js/home.js'],
+    'menu.css': ['css/base.css', 'css/menu.css'],
+    'menu.js': ['js/base.js', 'js/menu.js'],
+    'dashboard.css': ['css/base.css', 'css/dashboard.css'],
+    'dashboard.js': ['js/base.js', 'js/dashboard.js'],
+    'auth.css': ['css/base.css', 'css/auth.css'],
+    'auth.js': ['js/base.js', 'js/auth.js'],
+    'ai_helper.css': ['css/base.css', 'css/ai_helper.css'],
+    'ai_helper.js': ['js/ai_helper.js'],
+    'cart.css': ['css/cart.css'],
+}
+
+
+def minify_css(source):
+    """מיזעור CSS: הערות ורווחים מיותרים"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+# אחרי אחד מאלה '/' פותח regex ולא חילוק
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^}')
+REGEX_KEYWORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                  'void', 'throw', 'instanceof', 'yield', 'await'}
+
+
+def minify_js(source):
+    """מיזעור JS שמרני: הזחה, שורות ריקות והערות
+
+    סורק קטן עוקב אחרי מחרוזות, template literals ו-regex, כך ש-// או /* בתוכם
+    לא נחשבים הערה. שורה שמתחילה בתוך template literal נשמרת כמו שהיא - הרווחים
+    והשורות הריקות בה הם חלק מהמחרוזת. מעבר להערות אין שינוי בתוך שורות.
+    """
+    source = source.replace('\r\n', '\n')
+    lines = []
+    line = []
+    verbatim = False  # השורה התחילה בתוך template literal
+    stack = []        # '`' - template literal פתוח, '{' - סוגריים מסולסלים בקוד (כולל ${...})
+    last = ''         # הטוקן האחרון בקוד - להבחנה בין regex לחילוק
+    i, n = 0, len(source)
+
+    def end_line():
+        text = ''.join(line)
+        in_template = bool(stack) and stack[-1] == '`'
+        if not verbatim:
+            text = text.lstrip()
+        if not in_template:
+            text = text.rstrip()
+        if text or verbatim or in_template:
+            lines.append(text)
+        line.clear()
+        return in_template
+
+    while i < n:
+        c = source[i]
+        if c == '\n':
+            verbatim = end_line()
+            i += 1
+        elif stack and stack[-1] == '`':
+            if c == '\\':
+                line.append(source[i:i + 2])
+                i += 2
+            elif c == '`':
+                stack.pop()
+                line.append(c)
+                last = '`'
+                i += 1
+            elif source.startswith('${', i):
+                stack.append('{')
+                line.append('${')
+                last = '{'
+                i += 2
+            else:
+                line.append(c)
+                i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if '\n' in source[i:end]:
+                # הערה על כמה שורות נחשבת מעבר שורה (ASI) - גם בפלט
+                verbatim = end_line()
+            else:
+                line.append(' ')
+            i = end
+        elif c in '\'"':
+            j = i + 1
+            while j < n and source[j] not in (c, '\n'):
+                j += 2 if source[j] == '\\' else 1
+            line.append(source[i:j + 1])
+            last = c
+            i = j + 1
+        elif c == '/' and (last in REGEX_KEYWORDS or last in REGEX_PRECEDERS or last == ''):
+            j, in_class = i + 1, False
+            while j < n and source[j] != '\n' and (in_class or source[j] != '/'):
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            line.append(source[i:j + 1])
+            last = '/'
+            i = j + 1
+        elif c.isalnum() or c in '_$':
+            j = i
+            while j < n and (source[j].isalnum() or source[j] in '_$'):
+                j += 1
+            last = source[i:j]
+            line.append(last)
+            i = j
+        else:
+            if c == '`' or c == '{':
+                stack.append(c)
+            elif c == '}' and stack:
+                stack.pop()
+            if not c.isspace():
+                last = c
+            line.append(c)
+            i += 1
+    end_line()
+    return '\n'.join(lines)
+
+
+def build_assets(static_folder, bundles=None):
+    """בניית כל החבילות ל-static/dist וכתיבת ה-manifest
+
+    קבצים ישנים ב-dist שלא מופיעים ב-manifest החדש נמחקים.
+    מחזיר את ה-manifest ({שם לוגי: נתיב יחסי ל-static}).
+    """
+    bundles = BUNDLES if bundles is None else bundles
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+
+    manifest = {}
+    for name, sources in bundles.items():
+        stem, ext = os.path.splitext(name)
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        if ext == '.css':
+            content = '\n'.join(minify_css(part) for part in parts)
+        else:
+            # ';' בין קבצים - קובץ בלי ';' בסוף לא יתחבר לקובץ הבא
+            content = ';\n'.join(minify_js(part) for part in parts if part.strip())
+        data = content.encode('utf-8')
+
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}'
+        path = os.path.join(dist, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+        manifest[name] = f'{DIST_DIR}/{filename}'
+
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    keep = {os.path.basename(path) for path in manifest.values()} | {MANIFEST}
+    for filename in os.listdir(dist):
+        built = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if built not in keep:
+            os.remove(os.path.join(dist, filename))
+    return manifest
+
+
+class AssetManifest:
+    """ה-manifest של dist - נטען מחדש רק כשהקובץ משתנה (בנייה חדשה)"""
+
+    def __init__(self, static_folder):
+        self.path = os.path.join(static_folder, DIST_DIR, MANIFEST)
+        self._mtime = None
+        self._entries = {}
+
+    def entries(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._mtime, self._entries = None, {}
+            return self._entries
+        if mtime != self._mtime:
+            with open(self.path, encoding='utf-8') as f:
+                self._entries = json.load(f)
+            self._mtime = mtime
+        return self._entries
+
+
+def asset_urls(name):
+    """כתובות הקבצים לשם לוגי: הקובץ עם ה-hash אם נבנה, אחרת קבצי המקור"""
+    built = current_app.extensions['assets'].entries().get(name)
+    if built:
+        return [url_for('static', filename=built)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def asset_url(name):
+    return asset_urls(name)[0]
+
+
+def asset_tags(name):
+    """תגיות <link> / <script> לחבילה"""
+    if name.endswith('.css'):
+        tag = '<link rel="stylesheet" href="{}">'
+    else:
+        tag = '<script src="{}"></script>'
+    return Markup('\n'.join(tag.format(url) for url in asset_urls(name)))
+
+
+def immutable_assets(response):
+    """after_request: קבצים עם hash בשם נשמרים בדפדפן לשנה בלי revalidation
+
+    ה-manifest (בלי hash) נבדק מול השרת בכל שימוש.
+    """
+    filename = (request.view_args or {}).get('filename', '')
+    if request.endpoint != 'static':
+        return response
+    if filename == f'{DIST_DIR}/{MANIFEST}':
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True
+    elif IMMUTABLE_PATHS.match(filename) and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.extensions['assets'] = AssetManifest(app.static_folder)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_tags=asset_tags)
+    app.after_request(immutable_assets)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """בניית חבילות ה-JS/CSS ל-static/dist"""
+        main(app.static_folder)
+
+
+def main(static_folder=None):
+    from compression import precompress_static
+
+    static_folder = static_folder or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = build_assets(static_folder)
+    for name, path in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(static_folder, path))
+        sources = sum(os.path.getsize(os.path.join(static_folder, source)) for source in BUNDLES[name])
+        print(f'{name:15} {sources / 1024:7.1f} KB -> {size / 1024:7.1f} KB  {path}')
+    # גרסאות .gz / .br לחבילות, שמוגשות ישירות ע"י נתיב ה-static
+    precompress_static(os.path.join(static_folder, DIST_DIR))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# bench_startup.py
+"""מדידת זמן עליית האפליקציה (cold start)
+
+כל מדידה רצה בתהליך Python חדש: זמן import app, זמן create_app(),
+ורשימת המודולים הכבדים לפי python -X importtime.
+
+שימוש:
+    python bench_startup.py [--runs 5] [--top 10] [--max-import-ms 300]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+MEASURE = '''
+import sys, time
+sys.path.insert(0, {root!r})
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+print((t1 - t0) * 1000, (t2 - t1) * 1000)
+'''
+
+
+def run_once(workdir):
+    """מדידה אחת בתהליך חדש - מחזיר (import_ms, create_app_ms)"""
+    output = subprocess.run(
+        [sys.executable, '-c', MEASURE.format(root=ROOT)],
+        cwd=workdir, capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[-2]), float(output[-1])
+
+
+def heaviest_imports(workdir, top):
+    """המודולים שה-import שלהם הכי יקר (זמן מצטבר, מיקרו-שניות)"""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {ROOT!r}); import app'],
+        cwd=workdir, capture_output=True, text=True, check=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='מדידת cold start של האפליקציה')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-import-ms', type=float, default=None,
+                        help='כישלון (exit 1) אם החציון של import app גבוה מהסף')
+    args = parser.parse_args()
+
+    # תיקייה זמנית - מסד הנתונים ותיקיות ההעלאה נוצרים בה ולא בפרויקט
+    with tempfile.TemporaryDirectory() as workdir:
+        results = [run_once(workdir) for _ in range(args.runs)]
+        import_ms = statistics.median(r[0] for r in results)
+        create_ms = statistics.median(r[1] for r in results)
+
+        print(f"import app:   {import_ms:8.1f} ms (חציון של {args.runs})")
+        print(f"create_app(): {create_ms:8.1f} ms (כולל מיגרציות על מסד נתונים ריק)")
+        print(f"\nהמודולים הכבדים ביותר (top {args.top}):")
+        for cumulative, name in heaviest_imports(workdir, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"\n❌ import app איטי מהסף ({args.max_import_ms} ms)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# compression.py
+"""דחיסת תשובות (gzip / brotli) וקבצים סטטיים דחוסים מראש
+
+- תשובות דינמיות (HTML, JSON) נדחסות ב-after_request מעל COMPRESS_MIN_SIZE.
+  תשובות בזרימה (SSE, ייצוא דוחות) ותשובות send_file לא נדחסות.
+- קבצים סטטיים: שלב בנייה כותב ליד כל קובץ גרסאות .gz / .br, ונתיב ה-static
+  מגיש אותן ישירות כשהלקוח תומך - בלי דחיסה בכל בקשה.
+
+brotli אופציונלי (pip install brotli); בלעדיו רק gzip.
+
+בנייה:
+    python compression.py [--static static] [--min-size 1024]
+"""
+import argparse
+import gzip
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/x-ndjson',
+    'application/xml', 'image/svg+xml',
+}
+
+STATIC_EXTENSIONS = ('.js', '.css', '.html', '.svg', '.json', '.txt')
+
+# סיומת הקובץ הדחוס לכל קידוד, לפי סדר העדפה
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def available_encodings():
+    return [encoding for encoding, _ in ENCODINGS if encoding != 'br' or brotli is not None]
+
+
+def negotiate(encodings):
+    """הקידוד המועדף מבין encodings לפי Accept-Encoding, או None"""
+    accepted = request.accept_encodings
+    for encoding in encodings:
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+def compress_body(body, encoding):
+    """דחיסת גוף תשובה בקידוד שנבחר ב-negotiate"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=current_app.config['COMPRESS_BR_QUALITY'])
+    return gzip.compress(body, compresslevel=current_app.config['COMPRESS_LEVEL'], mtime=0)
+
+
+def compress_cached(body, encoded):
+    """(גוף, קידוד) לגוף שנשמר במטמון - כל קידוד נדחס פעם אחת ונשמר ב-encoded
+
+    קידוד None - הגוף קטן מדי או שהלקוח לא תומך בדחיסה.
+    """
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return body, None
+    encoding = negotiate(available_encodings())
+    if encoding is None:
+        return body, None
+    if encoding not in encoded:
+        encoded[encoding] = compress_body(body, encoding)
+    return encoded[encoding], encoding
+
+
+def compress_response(response):
+    """after_request: דחיסת תשובה דינמית אם היא גדולה מספיק והלקוח תומך"""
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoding = negotiate(available_encodings())
+    if encoding is None:
+        return response
+
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # הייצוג השתנה - ETag חזק של הגוף המקורי הופך לחלש
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def send_static(filename):
+    """נתיב static: מגיש .br / .gz מוכן אם קיים, עדכני, והלקוח תומך בו"""
+    static_folder = current_app.static_folder
+    max_age = current_app.get_send_file_max_age(filename)
+    path = os.path.join(static_folder, filename)
+
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        if not accepted[encoding]:
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime < os.stat(path).st_mtime:
+                continue  # הקובץ המקורי השתנה אחרי הבנייה
+        except OSError:
+            continue
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype, max_age=max_age)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    response = send_from_directory(static_folder, filename, max_age=max_age)
+    if filename.endswith(STATIC_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_compression(app):
+    """חיבור הדחיסה לאפליקציה"""
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+    app.after_request(compress_response)
+    if app.has_static_folder:
+        app.view_functions['static'] = send_static
+
+
+def precompress_static(static_folder, min_size=1024):
+    """כתיבת .gz (ו-.br אם brotli מותקן) ליד כל קובץ טקסט סטטי
+
+    קבצים שהגרסה הדחוסה שלהם עדכנית מדולגים. מחזיר רשימת
+    (נתיב, גודל מקורי, {קידוד: גודל}).
+    """
+    results = []
+    for root, _, files in os.walk(static_folder):
+        for name in sorted(files):
+            if not name.endswith(STATIC_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            sizes = {}
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                target = path + suffix
+                if not (os.path.exists(target) and os.stat(target).st_mtime >= stat.st_mtime):
+                    if encoding == 'br':
+                        compressed = brotli.compress(data, quality=11)
+                    else:
+                        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                    with open(target, 'wb') as f:
+                        f.write(compressed)
+                sizes[encoding] = os.path.getsize(target)
+            results.append((path, stat.st_size, sizes))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='דחיסה מראש של קבצים סטטיים')
+    parser.add_argument('--static', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    parser.add_argument('--min-size', type=int, default=1024)
+    args = parser.parse_args()
+
+    if brotli is None:
+        print('⚠️ brotli לא מותקן - נכתבים רק קבצי .gz')
+    for path, size, sizes in precompress_static(args.static, args.min_size):
+        compressed = ', '.join(f'{encoding} {value / 1024:.1f} KB' for encoding, value in sizes.items())
+        print(f'{os.path.relpath(path, args.static)}: {size / 1024:.1f} KB -> {compressed}')
+
+
+if __name__ == '__main__':
+    main()
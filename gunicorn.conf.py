@@ -0,0 +1,27 @@
+# gunicorn.conf.py
+"""הגדרות gunicorn ל-production
+
+    pip install gunicorn gevent
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+ערוץ ה-SSE (/api/stream/orders) מחזיק חיבור פתוח לכל דשבורד ודף הזמנה
+פתוחים. worker סינכרוני (ברירת המחדל של gunicorn) נתפס ע"י מנוי אחד לכל חייו,
+ולכן ה-workers כאן הם gevent: gunicorn מריץ monkey.patch_all() בעליית כל
+worker, וההמתנה של מנוי (threading.Condition ב-OrderEventHub) משחררת את
+ה-worker לבקשות אחרות. אירועי הזמנות עוברים דרך טבלת order_events, כך שמנוי
+ב-worker אחד מקבל גם הזמנות שנוצרו ב-worker אחר.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count() * 2)))
+worker_class = 'gevent'
+# מספר החיבורים הפתוחים (כולל מנויי SSE) לכל worker
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 100))
+# כל בקשה מחזיקה חיבור SQLite מהמאגר עד סופה (מנוי SSE מחזיר אותו לפני
+# הזרימה), אז מאגר בגודל worker_connections לא גורם לבקשות להמתין לחיבור.
+# ה-workers יורשים את הסביבה ו-create_app קורא ממנה את DB_POOL_SIZE.
+os.environ.setdefault('DB_POOL_SIZE', str(worker_connections))
+timeout = 30
+graceful_timeout = 10
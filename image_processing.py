@@ -0,0 +1,395 @@
+# image_processing.py
+"""עיבוד תמונות מחוץ לבקשה, וגרסאות רספונסיביות לכל תמונה
+
+העלאה שומרת את הקובץ ומחזירה מיד מזהה עבודה; פענוח, הקטנה ודחיסה רצים
+ב-ProcessPoolExecutor (Pillow תופס CPU ואת ה-GIL). בסיום העבודה התמונה
+מחוברת לפריט במסד הנתונים. מצב העבודה נשמר בטבלת image_jobs, כך שכל
+תהליך של השרת יכול לענות על בדיקת סטטוס.
+
+התמונות נשמרות לפי hash של התוכן המעובד (ImageStore): העלאה חוזרת של אותו
+קובץ לא מעובדת שוב, ה-URL של תמונה לא משתנה לעולם (immutable), ותמונה
+שאף פריט לא מפנה אליה נמחקת.
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# גרסאות בגדלים שונים (רוחב בפיקסלים) לכל תמונה - WebP, ו-JPEG לדפדפנים ישנים
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+# שם קובץ של תמונה במאגר: 16 תווי hex של hash התוכן המעובד (+ גרסה)
+STORED_IMAGE = re.compile(r'^[0-9a-f]{16}(-\d+)?\.(jpg|webp)$')
+# פורמטים שמתקבלים בהעלאה (לפי תוכן הקובץ, לא לפי הסיומת)
+UPLOAD_FORMATS = {'JPEG', 'MPO', 'PNG', 'GIF', 'WEBP'}
+# מקסימום פיקסלים לתמונה שהועלתה - מעל זה נדחית לפני פענוח (decompression bomb)
+MAX_IMAGE_PIXELS = 50_000_000
+# הקובץ הראשי (image_filename) - JPEG בתוך המסגרת הזו
+MAIN_SIZE = (800, 600)
+# ברירת מחדל ל-sizes: כרטיס ברבע רוחב במסך רחב, חצי בטאבלט, מלא בטלפון
+DEFAULT_SIZES = '(min-width: 992px) 25vw, (min-width: 768px) 50vw, 100vw'
+
+
+def to_rgb(img):
+    """המרה ל-RGB; שקיפות מונחת על רקע לבן (ולא שחור כמו convert)"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        from PIL import Image
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def variant_filename(image_filename, width, ext):
+    """שם קובץ הגרסה: <שם>-<רוחב>.<סיומת>"""
+    return f"{image_filename.rsplit('.', 1)[0]}-{width}.{ext}"
+
+
+def image_files(image_filename, variants=None):
+    """כל הקבצים של תמונה - הקובץ הראשי וכל הגרסאות"""
+    if not image_filename:
+        return []
+    files = [image_filename]
+    for width in (variants or {}).get('widths', []):
+        files.extend(variant_filename(image_filename, width, ext) for ext in variants['formats'])
+    return files
+
+
+def remove_image_files(folder, image_filename, variants=None):
+    for filename in image_files(image_filename, variants):
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _write_file(path, data):
+    """כתיבה אטומית - קורא לעולם לא רואה קובץ חלקי"""
+    temp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _encode(img, pil_format, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(img, folder, image_filename):
+    """כתיבת גרסאות בכל הרוחבים ב-VARIANT_WIDTHS שלא גדולים מהמקור
+
+    כל גרסה מוקטנת מהגרסה הגדולה שלפניה (זול יותר מהקטנה מהמקור כל פעם).
+    מחזיר את תיאור הגרסאות שנשמר ב-menu_items.image_variants.
+    """
+    from PIL import Image
+
+    img = to_rgb(img)
+    largest = min(img.width, VARIANT_WIDTHS[-1])
+    widths = [width for width in VARIANT_WIDTHS if width < largest] + [largest]
+
+    current = img
+    for width in reversed(widths):
+        height = max(1, round(img.height * width / img.width))
+        if current.size != (width, height):
+            current = current.resize((width, height), Image.Resampling.LANCZOS)
+        for ext, pil_format, options in VARIANT_FORMATS:
+            _write_file(os.path.join(folder, variant_filename(image_filename, width, ext)),
+                        _encode(current, pil_format, **options))
+
+    return {
+        'widths': widths,
+        'formats': [ext for ext, _, _ in VARIANT_FORMATS],
+        'width': largest,
+        'height': max(1, round(img.height * largest / img.width)),
+    }
+
+
+def is_stored_image(image_filename):
+    """האם זה שם של תמונה ממאגר התמונות (<hash>.jpg)"""
+    return bool(image_filename and STORED_IMAGE.match(image_filename))
+
+
+def read_upload(stream, max_pixels=MAX_IMAGE_PIXELS, chunk_size=64 * 1024):
+    """קריאת קובץ שהועלה, עם בדיקת הכותרת כבר בחלקים הראשונים
+
+    פורמט ומידות נקראים מהכותרת (ImageFile.Parser) לפני שקוראים את שאר
+    הקובץ; קובץ שאינו תמונה נתמכת או גדול מ-max_pixels נדחה מיד, בלי פענוח.
+    מחזיר (data, format, (width, height)). זורק ValueError עם הודעה למשתמש.
+    """
+    from PIL import Image, ImageFile
+
+    parser = ImageFile.Parser()
+    chunks = []
+    header = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        if header is None:
+            try:
+                parser.feed(chunk)
+            except Image.DecompressionBombError:
+                raise ValueError('התמונה גדולה מדי') from None
+            if parser.image is None:
+                continue
+            header = (parser.image.format, parser.image.size)
+            # מכאן רק אוספים בתים - הפענוח עצמו רץ בעבודת הרקע
+            parser = None
+            if header[0] not in UPLOAD_FORMATS:
+                raise ValueError('סוג קובץ לא נתמך. השתמש ב-JPG, PNG, GIF או WebP')
+            width, height = header[1]
+            if width * height > max_pixels:
+                raise ValueError(f'התמונה גדולה מדי ({width}x{height})')
+
+    if header is None:
+        raise ValueError('הקובץ אינו תמונה תקינה')
+    return b''.join(chunks), header[0], header[1]
+
+
+def process_menu_image(data, folder):
+    """עבודת העיבוד של תמונה שהועלתה (רצה בתהליך נפרד)
+
+    פענוח אחד ישירות מהבתים שבזיכרון: JPEG מפוענח ברזולוציה מוקטנת (draft)
+    שעדיין מספיקה לגרסה הגדולה ביותר, ומאותה תמונה נכתבים הקובץ הראשי
+    (JPEG עד 800x600) והגרסאות הרספונסיביות. השם לפי hash של הבתים המעובדים
+    (<hash>.jpg); תמונה מעובדת זהה לקיימת נכתבת מחדש לאותם שמות עם אותו
+    תוכן. מחזיר {'filename', 'variants'}, או None.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format in ('JPEG', 'MPO'):
+                # draft בוחר קנה מידה 1/2, 1/4 או 1/8 שנשאר לפחות בגודל המבוקש.
+                # הגודל נמדד אחרי הסיבוב לפי EXIF (5-8: רוחב וגובה מתחלפים)
+                rotated = img.getexif().get(0x0112) in (5, 6, 7, 8)
+                upright_width, upright_height = (img.height, img.width) if rotated else img.size
+                width = max(VARIANT_WIDTHS[-1], MAIN_SIZE[0])
+                height = max(MAIN_SIZE[1], round(upright_height * width / upright_width))
+                img.draft('RGB', (height, width) if rotated else (width, height))
+            # תמונות מטלפון: סיבוב לפי EXIF, אחרת הן נשמרות על הצד
+            img = ImageOps.exif_transpose(img)
+
+            # thumbnail משנה את התמונה במקום - הגרסאות נוצרות מהמקור המלא
+            main = to_rgb(img).copy()
+            main.thumbnail(MAIN_SIZE, Image.Resampling.LANCZOS)
+            encoded = _encode(main, 'JPEG', quality=85, optimize=True)
+            filename = f'{hashlib.sha256(encoded).hexdigest()[:16]}.jpg'
+
+            variants = generate_variants(img, folder, filename)
+            _write_file(os.path.join(folder, filename), encoded)
+        return {'filename': filename, 'variants': variants}
+    except Exception as e:
+        print(f"Error processing image: {e}")
+        return None
+
+
+def parse_variants(value):
+    """image_variants מהמסד - dict (רשומה קומפקטית) או מחרוזת JSON"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def variant_srcset(image_filename, variants, ext):
+    """ערך srcset לפורמט אחד: "<url> 160w, <url> 320w, ..." """
+    from flask import url_for
+
+    return ', '.join(
+        f"{url_for('static', filename='images/menu-items/' + variant_filename(image_filename, width, ext))} {width}w"
+        for width in variants['widths']
+    )
+
+
+def menu_picture(item, css_class='menu-item-image', sizes=DEFAULT_SIZES, **attrs):
+    """תגית <picture> לתמונת פריט: WebP ב-srcset, JPEG כגיבוי
+
+    הדפדפן בוחר לפי sizes את הגרסה הקטנה ביותר שמספיקה לרוחב המוצג.
+    פריט בלי גרסאות (תמונה ישנה) מקבל <img> רגיל לקובץ הראשי.
+    """
+    from flask import url_for
+    from markupsafe import Markup, escape
+
+    image_filename = item['image_filename']
+    extra = ''.join(f' {name.rstrip("_").replace("_", "-")}="{escape(value)}"' for name, value in attrs.items())
+    variants = parse_variants(item.get('image_variants'))
+    if not variants:
+        src = url_for('static', filename='images/menu-items/' + image_filename)
+        return Markup(f'<img src="{escape(src)}" class="{css_class}" alt="{escape(item["name"])}"{extra}>')
+
+    fallback = url_for('static', filename='images/menu-items/' + variant_filename(
+        image_filename, variants['widths'][min(2, len(variants['widths']) - 1)], 'jpg'
+    ))
+    return Markup(
+        '<picture>'
+        f'<source type="image/webp" srcset="{escape(variant_srcset(image_filename, variants, "webp"))}" sizes="{sizes}">'
+        f'<img src="{escape(fallback)}" srcset="{escape(variant_srcset(image_filename, variants, "jpg"))}" sizes="{sizes}"'
+        f' width="{variants["width"]}" height="{variants["height"]}"'
+        f' class="{css_class}" alt="{escape(item["name"])}"{extra}>'
+        '</picture>'
+    )
+
+
+class ImageStore:
+    """מאגר התמונות: קבצים לפי hash, מונה הפניות בטבלת image_blobs
+
+    חיבור תמונה לפריט ואיסוף זבל רצים בתוך db.writer(), כלומר בזה אחר זה:
+    תמונה לא יכולה להימחק בין הבדיקה שהקבצים קיימים לבין החיבור שלה לפריט.
+    """
+
+    def __init__(self, database, folder):
+        self.db = database
+        self.folder = folder
+
+    def _exists(self, filename, variants):
+        return all(os.path.exists(os.path.join(self.folder, name)) for name in image_files(filename, variants))
+
+    def find(self, source_hash):
+        """תמונה מעובדת קיימת מאותו קובץ מקור (כדי לדלג על עיבוד), או None"""
+        blob = self.db.get_image_blob_by_source(source_hash)
+        if blob and self._exists(blob['filename'], blob['image_variants']):
+            return blob
+        return None
+
+    def attach(self, item_id, filename, variants, source_hash=None, release_previous=True):
+        """חיבור תמונה לפריט - מחזיר True אם חוברה
+
+        התמונה הקודמת של הפריט משוחררת (נמחקת אם אין לה עוד הפניות), אלא אם
+        release_previous=False - למשל קובץ מקור שנשמר לעיבוד מחדש.
+        """
+        with self.db.writer():
+            if not self._exists(filename, variants):
+                return False
+            previous = self.db.get_menu_item_image(item_id)
+            self.db.add_image_blob(filename, source_hash, variants)
+            if not self.db.update_menu_item_image(item_id, filename, variants):
+                return False
+        if release_previous:
+            self.release(*previous)
+        return True
+
+    def detach(self, item_id):
+        """הסרת התמונה מפריט"""
+        with self.db.writer():
+            previous = self.db.get_menu_item_image(item_id)
+            success = self.db.update_menu_item_image(item_id, None)
+        self.release(*previous)
+        return success
+
+    def release(self, filename, variants=None):
+        """תמונה שהוסרה מפריט: תמונת מאגר נמחקת באיסוף זבל, קובץ ישן כשאין לו הפניות"""
+        if not filename:
+            return
+        if is_stored_image(filename):
+            self.collect_garbage()
+        else:
+            with self.db.writer():
+                if self.db.count_menu_items_with_image(filename) == 0:
+                    remove_image_files(self.folder, filename, variants)
+
+    def collect_garbage(self):
+        """מחיקת כל התמונות במאגר שאף פריט לא מפנה אליהן - מחזיר את מספרן"""
+        with self.db.writer():
+            unreferenced = self.db.delete_unreferenced_image_blobs()
+            for filename, variants in unreferenced:
+                remove_image_files(self.folder, filename, variants)
+        return len(unreferenced)
+
+
+class ImageJobQueue:
+    """תור עבודות עיבוד תמונה על מאגר תהליכים
+
+    מצבים: pending -> processing -> done / failed. processing מזוהה רק
+    בתהליך ששלח את העבודה; בתהליכים אחרים העבודה נראית pending עד הסיום.
+    העלאה של קובץ שכבר עובד מחוברת מיד (done) בלי עיבוד.
+    """
+
+    def __init__(self, database, store, max_workers=2):
+        self.db = database
+        self.store = store
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # המאגר נוצר בהעלאה הראשונה - לא בעליית האפליקציה
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def submit(self, item_id, data, user_id=None, ip_address=None):
+        """קבלת קובץ שהועלה (bytes, אחרי read_upload) - מחזיר job_id"""
+        job_id = uuid.uuid4().hex
+        source_hash = hashlib.sha256(data).hexdigest()
+
+        blob = self.store.find(source_hash)
+        if blob and self.store.attach(item_id, blob['filename'], blob['image_variants']):
+            self.db.create_image_job(job_id, item_id, blob['filename'])
+            self.db.update_image_job(job_id, 'done')
+            self.db.log_activity(user_id, 'image_upload', f'Image reused for menu item {item_id}', ip_address)
+            return job_id
+
+        # הבתים עוברים לתהליך העיבוד ישירות - בלי קובץ זמני בדיסק
+        self.db.create_image_job(job_id, item_id, '')
+        future = self._pool().submit(process_menu_image, data, self.store.folder)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(
+            lambda done: self._finish(job_id, done, item_id, source_hash, user_id, ip_address)
+        )
+        return job_id
+
+    def _finish(self, job_id, future, item_id, source_hash, user_id, ip_address):
+        """סיום עבודה (ב-thread של המאגר): חיבור התמונה לפריט"""
+        with self._lock:
+            self._futures.pop(job_id, None)
+        try:
+            error = None
+            try:
+                result = future.result()
+            except Exception as e:
+                result, error = None, str(e)
+
+            if result and self.store.attach(item_id, result['filename'], result['variants'], source_hash):
+                self.db.update_image_job(job_id, 'done', filename=result['filename'])
+                self.db.log_activity(user_id, 'image_upload', f'Image uploaded for menu item {item_id}', ip_address)
+            else:
+                self.db.update_image_job(job_id, 'failed', error or 'שגיאה בעיבוד התמונה')
+        except Exception as e:
+            print(f"Error finishing image job {job_id}: {e}")
+
+    def status(self, job_id):
+        """מצב העבודה כ-dict, או None אם אין עבודה כזו"""
+        job = self.db.get_image_job(job_id)
+        if job and job['status'] == 'pending':
+            with self._lock:
+                future = self._futures.get(job_id)
+            if future is not None and future.running():
+                job['status'] = 'processing'
+        return job
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
@@ -0,0 +1,190 @@
+# cart.py
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+
+def _line_dict(line_id, item_id, name, price, quantity, special_requests):
+    """שורת עגלה בפורמט שהתבניות ו-place_order מצפים לו"""
+    return {
+        'line_id': line_id,
+        'id': item_id,
+        'name': name,
+        'price': price,
+        'quantity': quantity,
+        'special_requests': special_requests,
+    }
+
+
+class MemoryCartStore:
+    """עגלות בזיכרון התהליך - לפיתוח ולתהליך יחיד
+
+    שורות ממופות לפי (item_id, special_requests), כך שהוספה של פריט קיים היא
+    חיפוש במילון ולא סריקה. כמות וסכום כוללים מתעדכנים בכל שינוי.
+    מספר העגלות מוגבל ל-max_carts; העגלה שלא נגעו בה הכי הרבה זמן נמחקת.
+    עגלה שלא נגעו בה max_age שניות נמחקת ב-prune.
+    """
+
+    def __init__(self, max_carts=10000, max_age=7 * 24 * 3600):
+        self.max_carts = max_carts
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._carts = OrderedDict()
+        self._line_ids = itertools.count(1)
+
+    def _cart(self, cart_id, create=False):
+        cart = self._carts.get(cart_id)
+        if cart is None and create:
+            cart = self._carts[cart_id] = {'lines': {}, 'count': 0, 'total': 0.0}
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+        if cart is not None:
+            cart['touched'] = time.monotonic()
+            self._carts.move_to_end(cart_id)
+        return cart
+
+    def summary(self, cart_id):
+        """(כמות פריטים, סכום) - בלי מעבר על השורות"""
+        with self._lock:
+            cart = self._cart(cart_id)
+            if cart is None:
+                return 0, 0.0
+            return cart['count'], round(cart['total'], 2)
+
+    def lines(self, cart_id):
+        with self._lock:
+            cart = self._cart(cart_id)
+            if cart is None:
+                return []
+            return [dict(line) for line in cart['lines'].values()]
+
+    def add(self, cart_id, item, quantity, special_requests=''):
+        """הוספת פריט - מאחד עם שורה קיימת עם אותן בקשות מיוחדות"""
+        with self._lock:
+            cart = self._cart(cart_id, create=True)
+            key = (item['id'], special_requests)
+            line = cart['lines'].get(key)
+            if line is None:
+                line = cart['lines'][key] = _line_dict(
+                    next(self._line_ids), item['id'], item['name'], item['price'], 0, special_requests
+                )
+            line['quantity'] += quantity
+            cart['count'] += quantity
+            cart['total'] += line['price'] * quantity
+
+    def remove(self, cart_id, line_id):
+        """הסרת שורה - מחזיר את השורה שהוסרה או None"""
+        with self._lock:
+            cart = self._cart(cart_id)
+            if cart is None:
+                return None
+            for key, line in cart['lines'].items():
+                if line['line_id'] == line_id:
+                    del cart['lines'][key]
+                    cart['count'] -= line['quantity']
+                    cart['total'] -= line['price'] * line['quantity']
+                    return dict(line)
+            return None
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def prune(self):
+        """מחיקת עגלות ישנות - הסדר הוא לפי נגיעה אחרונה, כך שעוצרים בראשונה שעדכנית"""
+        cutoff = time.monotonic() - self.max_age
+        removed = 0
+        with self._lock:
+            while self._carts and next(iter(self._carts.values()))['touched'] < cutoff:
+                self._carts.popitem(last=False)
+                removed += 1
+        return removed
+
+
+class SqliteCartStore:
+    """עגלות בטבלאות carts / cart_lines - משותפות לכל התהליכים
+
+    item_count ו-total בטבלת carts מתעדכנים בטריגרים על cart_lines
+    (מיגרציה 008), כך שמונה העגלה הוא שליפה של שורה אחת. עגלות שלא
+    עודכנו max_age שניות (session שפג או נזנח) נמחקות ב-prune, לכל היותר
+    פעם ב-prune_interval שניות בכל תהליך.
+    """
+
+    def __init__(self, database, max_age=7 * 24 * 3600, prune_interval=3600):
+        self.db = database
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._pruned_at = None
+
+    def summary(self, cart_id):
+        conn = self.db.get_connection()
+        row = conn.execute(
+            'SELECT item_count, total FROM carts WHERE cart_id = ?', (cart_id,)
+        ).fetchone()
+        conn.close()
+        if row is None:
+            return 0, 0.0
+        return row['item_count'], round(row['total'], 2)
+
+    def lines(self, cart_id):
+        conn = self.db.get_connection()
+        rows = conn.execute('''
+            SELECT id, item_id, name, price, quantity, special_requests
+            FROM cart_lines WHERE cart_id = ? ORDER BY id
+        ''', (cart_id,)).fetchall()
+        conn.close()
+        return [_line_dict(*row) for row in rows]
+
+    def add(self, cart_id, item, quantity, special_requests=''):
+        with self.db.writer() as conn:
+            conn.execute('''
+                INSERT INTO carts (cart_id) VALUES (?)
+                ON CONFLICT (cart_id) DO UPDATE SET updated_at = CURRENT_TIMESTAMP
+            ''', (cart_id,))
+            conn.execute('''
+                INSERT INTO cart_lines (cart_id, item_id, special_requests, name, price, quantity)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (cart_id, item_id, special_requests)
+                DO UPDATE SET quantity = quantity + excluded.quantity
+            ''', (cart_id, item['id'], special_requests, item['name'], item['price'], quantity))
+
+    def remove(self, cart_id, line_id):
+        with self.db.writer() as conn:
+            row = conn.execute('''
+                SELECT id, item_id, name, price, quantity, special_requests
+                FROM cart_lines WHERE id = ? AND cart_id = ?
+            ''', (line_id, cart_id)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM cart_lines WHERE id = ?', (line_id,))
+            return _line_dict(*row)
+
+    def clear(self, cart_id):
+        with self.db.writer() as conn:
+            conn.execute('DELETE FROM cart_lines WHERE cart_id = ?', (cart_id,))
+            conn.execute('DELETE FROM carts WHERE cart_id = ?', (cart_id,))
+
+    def prune(self):
+        """מחיקת עגלות ישנות (אינדקס על carts.updated_at, מיגרציה 012) - מחזיר את מספרן"""
+        now = time.monotonic()
+        if self._pruned_at is not None and now - self._pruned_at < self.prune_interval:
+            return 0
+        self._pruned_at = now
+        with self.db.writer() as conn:
+            removed = conn.execute(
+                "DELETE FROM carts WHERE updated_at < datetime('now', ?)", (f'-{int(self.max_age)} seconds',)
+            ).rowcount
+            if removed:
+                # הטריגרים של cart_lines לא מוצאים עגלה לעדכן - רק השורות נמחקות
+                conn.execute('DELETE FROM cart_lines WHERE cart_id NOT IN (SELECT cart_id FROM carts)')
+        return removed
+
+
+def create_cart_store(kind, database, max_age=7 * 24 * 3600):
+    """יצירת מאגר עגלות לפי CART_STORE: 'sqlite' (ברירת מחדל) או 'memory'"""
+    if kind == 'memory':
+        return MemoryCartStore(max_age=max_age)
+    if kind == 'sqlite':
+        return SqliteCartStore(database, max_age=max_age)
+    raise ValueError(f'Unknown cart store: {kind}')
@@ -1,23 +1,666 @@
 # database.py
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
+import atexit
+import base64
+import json
+import math
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from models.events import OrderEventHub
+
+
+# פרופיל PRAGMA ברירת מחדל לכל חיבור - ניתן לדרוס דרך db(pragmas=...)
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',       # קוראים לא נחסמים ע"י כותבים
+    'synchronous': 'NORMAL',     # בטוח ב-WAL, חוסך fsync בכל commit
+    'busy_timeout': 5000,        # מילישניות המתנה לנעילה מתהליך אחר
+    'mmap_size': 64 * 1024 * 1024,
+    'cache_size': -16000,        # ערך שלילי = KiB
+    'temp_store': 'MEMORY',
+}
+
+
+def encode_cursor(created_at, row_id):
+    """קידוד מיקום בדפדוף keyset (created_at, id) למחרוזת בטוחה ל-URL"""
+    raw = f'{created_at}|{row_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """פענוח cursor של דפדוף - מחזיר (created_at, id), או None אם ה-cursor לא תקין"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').rsplit('|', 1)
+        return created_at, int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+# ממירים לפי שם עמודה - מופעלים פעם אחת, בשכבת מסד הנתונים, במצב compact
+COLUMN_CONVERTERS = {}
+_record_types = {}
+
+
+def register_column_converter(column, converter):
+    """רישום פונקציית המרה לעמודה (למשל מחרוזת תאריך -> datetime)"""
+    COLUMN_CONVERTERS[column] = converter
+    _record_types.clear()
+
+
+def parse_timestamp(value):
+    """המרת TIMESTAMP של SQLite ל-datetime (None אם לא ניתן לפענח)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+for _column in ('created_at', 'updated_at', 'processed_at', 'estimated_delivery'):
+    register_column_converter(_column, parse_timestamp)
+
+
+def parse_json(value):
+    """עמודת JSON (למשל image_variants) - None אם ריקה או לא תקינה"""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return None
+
+
+register_column_converter('image_variants', parse_json)
+
+
+class Record(tuple):
+    """שורה קומפקטית: tuple עם אינדקס עמודות משותף לכל השורות מאותו סוג
+
+    תומכת ב-record['name'], record.name ו-record[0]. שימו לב ששמות כמו
+    count/index מתנגשים עם מתודות של tuple בגישה כמאפיין.
+    """
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+    _converters = ()
+    _json_keys = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._fields
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def __repr__(self):
+        return f'Record({self._asdict()!r})'
+
+    @classmethod
+    def _make(cls, values):
+        """יצירת רשומה מערכים גולמיים, כולל המרות העמודות"""
+        if cls._converters:
+            values = list(values)
+            for position, converter in cls._converters:
+                values[position] = converter(values[position])
+        return tuple.__new__(cls, values)
+
+
+def record_type(columns):
+    """סוג רשומה משותף לכל השורות עם אותן עמודות (נשמר במטמון)"""
+    columns = tuple(columns)
+    cls = _record_types.get(columns)
+    if cls is None:
+        cls = type('Record', (Record,), {
+            '__slots__': (),
+            '_fields': columns,
+            '_index': {name: position for position, name in enumerate(columns)},
+            '_converters': tuple(
+                (position, COLUMN_CONVERTERS[name])
+                for position, name in enumerate(columns) if name in COLUMN_CONVERTERS
+            ),
+            '_json_keys': tuple(json.dumps(name, ensure_ascii=False) + ':' for name in columns),
+        })
+        _record_types[columns] = cls
+    return cls
+
+
+def compact_row_factory(cursor, row):
+    """row_factory למצב compact - מחזיר Record במקום sqlite3.Row/dict"""
+    return record_type(column[0] for column in cursor.description)._make(row)
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return '"' + value.isoformat(sep=' ') + '"'
+    return json.dumps(value, ensure_ascii=False)
+
+
+def dumps_records(records):
+    """קידוד רשומות קומפקטיות ל-JSON ישירות, בלי dict ביניים"""
+    return '[' + ','.join(
+        '{' + ','.join(key + _json_value(value) for key, value in zip(record._json_keys, record)) + '}'
+        for record in records
+    ) + ']'
+
+
+class PoolTimeoutError(Exception):
+    """אין חיבור פנוי במאגר בזמן שהוקצב"""
+
+
+class ConnectionPool:
+    """מאגר חיבורי SQLite לשימוש חוזר"""
+
+    def __init__(self, db_path, size=5, timeout=10.0, health_check_interval=30.0, pragmas=None):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self):
+        """פתיחת חיבור חדש למאגר"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # מאפשר גישה לעמודות באמצעות שם
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _is_healthy(self, conn):
+        """בדיקת תקינות חיבור שחזר מהמאגר"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        """סגירת חיבור פגום ופינוי מקומו במאגר"""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def acquire(self):
+        """קבלת חיבור מהמאגר - חיבור פנוי, חיבור חדש או המתנה לחיבור שישתחרר"""
+        if self._closed:
+            raise PoolTimeoutError('מאגר החיבורים סגור')
+
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        return self._connect()
+                    except sqlite3.Error:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                try:
+                    conn, released_at = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeoutError(f'לא התפנה חיבור למסד הנתונים תוך {self.timeout} שניות')
+
+            # חיבור שישב זמן רב במאגר נבדק לפני שמחזירים אותו
+            if time.monotonic() - released_at < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn):
+        """החזרת חיבור למאגר"""
+        if self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    def close_all(self):
+        """סגירת כל החיבורים הפנויים במאגר"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+class PooledConnection:
+    """עטיפה לחיבור מהמאגר - close() מחזיר את החיבור למאגר במקום לסגור אותו"""
+
+    def __init__(self, owner, conn):
+        self._owner = owner
+        self._conn = conn
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        self.close()
+        return False
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._owner._release_connection()
+
+
+class MenuCache:
+    """מטמון תפריט בזיכרון תחת מספר גרסה
+
+    קטגוריות, רשימות פריטים לפי קטגוריה ואינדקס לפי id נשמרים בזיכרון.
+    כתיבות דרך db מבטלות את המטמון מיד (write-through); שינויים מתהליכים
+    אחרים מזוהים ע"י PRAGMA data_version ומונה גרסת התפריט שמתעדכן בטריגרים.
+    """
+
+    def __init__(self, pool, check_interval=1.0):
+        self.pool = pool
+        self.check_interval = check_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._snapshot = None
+        self._data_version = None
+        self._checked_at = 0.0
+
+    def _connection(self):
+        """חיבור ייעודי למטמון - data_version נמדד ביחס לחיבור מסוים"""
+        if self._conn is None:
+            self._conn = self.pool._connect()
+        return self._conn
+
+    def invalidate(self):
+        """ביטול המטמון אחרי כתיבה לתפריט"""
+        with self._lock:
+            self._snapshot = None
+            self.version += 1
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._snapshot = None
+
+    def snapshot(self):
+        """תמונת התפריט העדכנית - בדרך כלל ללא שום שאילתה"""
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+            self._checked_at = now
+
+            conn = self._connection()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if self._snapshot is not None and data_version == self._data_version:
+                return self._snapshot
+            self._data_version = data_version
+
+            revision = conn.execute(
+                "SELECT version FROM cache_versions WHERE name = 'menu'"
+            ).fetchone()[0]
+            if self._snapshot is not None and revision == self._snapshot['revision']:
+                return self._snapshot
+
+            if self._snapshot is not None:
+                # שינוי בתפריט מחיבור או מתהליך אחר
+                self.version += 1
+            self._snapshot = self._load(conn)
+            return self._snapshot
+
+    def _load(self, conn):
+        """טעינת כל התפריט בקריאה עקבית אחת"""
+        conn.execute('BEGIN')
+        try:
+            revision = conn.execute(
+                "SELECT version FROM cache_versions WHERE name = 'menu'"
+            ).fetchone()[0]
+            rows = conn.execute('SELECT * FROM menu_items ORDER BY id').fetchall()
+        finally:
+            conn.commit()
+
+        items = [dict(row) for row in rows]
+        by_id = {item['id']: item for item in items}
+
+        # קטגוריות לפי סדר הופעה, כמו SELECT DISTINCT
+        categories = []
+        for item in items:
+            if item['is_available'] and item['category'] not in categories:
+                categories.append(item['category'])
+
+        ordered = sorted(items, key=lambda item: (item['category'], item['name']))
+        available = [item for item in ordered if item['is_available']]
+        by_category = {}
+        available_by_category = {}
+        for item in ordered:
+            by_category.setdefault(item['category'], []).append(item)
+            if item['is_available']:
+                available_by_category.setdefault(item['category'], []).append(item)
+
+        # אותם פריטים כרשומות קומפקטיות משותפות (לא משתנות, לכן לא מועתקות)
+        make = record_type(items[0].keys())._make if items else None
+        compact = {item['id']: make(item.values()) for item in items}
+
+        return {
+            'revision': revision,
+            'version': self.version,
+            'compact': compact,
+            'items': ordered,
+            'available': available,
+            'by_id': by_id,
+            'by_category': by_category,
+            'available_by_category': available_by_category,
+            'categories': categories,
+            'stats': self._stats(items),
+            # פריטים שעודכנו לאחרונה (כולל לא זמינים) - לדשבורד
+            'recent': sorted(items, key=lambda item: (item['updated_at'] or '', item['id']), reverse=True),
+        }
+
+    @staticmethod
+    def _stats(items):
+        """ספירות לפי זמינות וקטגוריה - מחושבות פעם אחת לכל טעינת תפריט"""
+        per_category = {}
+        available = 0
+        for item in items:
+            counts = per_category.setdefault(item['category'], {'total': 0, 'available': 0})
+            counts['total'] += 1
+            if item['is_available']:
+                counts['available'] += 1
+                available += 1
+        return {
+            'total': len(items),
+            'available': available,
+            'unavailable': len(items) - available,
+            'categories': per_category,
+        }
+
+
+class ActivityLogWriter:
+    """כתיבת לוג פעילות ברקע - תור חסום, כתיבה במנות עם executemany
+
+    מנה נכתבת כשהצטברו batch_size רשומות או כשעברו flush_interval שניות.
+    overflow קובע מה קורה כשהתור מלא: 'sync' - כתיבה ישירה, 'block' - המתנה
+    למקום בתור (או כתיבה ישירה בתוך db.writer()), 'drop' - השלכת הרשומה
+    (נספרת ב-dropped).
+    """
+
+    OVERFLOW_POLICIES = ('sync', 'block', 'drop')
+
+    def __init__(self, owner, max_queue=1000, batch_size=50, flush_interval=1.0, overflow='sync'):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f'overflow לא מוכר: {overflow}')
+        self._owner = owner
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = object()
+
+    def submit(self, row):
+        """הוספת רשומה לתור (user_id, action, description, ip_address, created_at)"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # מי שמחזיק את נתיב הכתיבה לא ממתין לתור: ה-thread שמרוקן אותו
+            # ממתין לאותו נתיב - כותבים ישירות, בתוך הטרנזקציה הנוכחית
+            if self.overflow == 'block' and getattr(self._owner._local, 'write_depth', 0) == 0:
+                self._queue.put(row)
+            elif self.overflow == 'drop':
+                self.dropped += 1
+            else:
+                self._write([row])
+
+    def _ensure_started(self):
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # thread שמת (שגיאה לא צפויה) מוחלף - אחרת הרשומות נשארות בתור
+                if self._thread is None:
+                    atexit.register(self.stop)
+                self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            if row is self._stop:
+                self._queue.task_done()
+                return
+
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is self._stop:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            self._write(batch)
+            for _ in range(len(batch) + stopping):
+                self._queue.task_done()
+            if stopping:
+                return
+
+    def _write(self, rows):
+        try:
+            with self._owner.writer() as conn:
+                conn.executemany('''
+                    INSERT INTO activity_logs (user_id, action, description, ip_address, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', rows)
+        except Exception as e:
+            # גם PoolTimeoutError - שגיאה כאן לא עוצרת את ה-thread
+            print(f"Error writing activity log: {e}")
+
+    def flush(self):
+        """המתנה עד שכל הרשומות שבתור נכתבו"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self):
+        """ריקון התור ועצירת ה-thread (נקרא גם ביציאה מהתהליך)"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(self._stop)
+            thread.join()
+
 
 class db:
-    def __init__(self, db_path='roladin_restaurant.db'):
+    def __init__(self, db_path='roladin_restaurant.db', pool_size=5, pool_timeout=10.0, pragmas=None):
         self.db_path = db_path
-        self.init_database()
+        self.pool = ConnectionPool(db_path, size=pool_size, timeout=pool_timeout, pragmas=pragmas)
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._has_app_context = None
+        self.menu_cache = MenuCache(self.pool)
+        self.activity_log = ActivityLogWriter(self)
+        self.events = OrderEventHub(self)
+        # אתחול הסכמה מפורש: init_database() או init_app() - לא בזמן יצירת האובייקט
         # הוסרה השורה הבעייתית: self.image_filename = image_filename
     
+    def init_app(self, app):
+        """חיבור למחזור החיים של Flask - חיבור אחד לכל בקשה, מוחזר למאגר בסוף הבקשה
+
+        מריץ גם את המיגרציות (init_database).
+        """
+        from flask import has_app_context
+
+        self.pool.size = app.config.get('DB_POOL_SIZE', self.pool.size)
+        self.pool.timeout = app.config.get('DB_POOL_TIMEOUT', self.pool.timeout)
+        self.pool.pragmas.update(app.config.get('DB_PRAGMAS', {}))
+        self.menu_cache.check_interval = app.config.get('MENU_CACHE_CHECK_INTERVAL', self.menu_cache.check_interval)
+        self.activity_log.batch_size = app.config.get('ACTIVITY_LOG_BATCH_SIZE', self.activity_log.batch_size)
+        self.activity_log.flush_interval = app.config.get('ACTIVITY_LOG_FLUSH_INTERVAL', self.activity_log.flush_interval)
+        self.activity_log.overflow = app.config.get('ACTIVITY_LOG_OVERFLOW', self.activity_log.overflow)
+        self.events.poll_interval = app.config.get('ORDER_EVENTS_POLL_INTERVAL', self.events.poll_interval)
+        self._has_app_context = has_app_context
+        app.teardown_appcontext(self.teardown)
+        self.init_database()
+
     def get_connection(self):
-        """יצירת חיבור למסד הנתונים"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # מאפשר גישה לעמודות באמצעות שם
-        return conn
+        """קבלת חיבור למסד הנתונים מהמאגר (אותו חיבור לכל הקריאות באותו thread)"""
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            local.conn = self.pool.acquire()
+            local.depth = 0
+            local.request_bound = bool(self._has_app_context and self._has_app_context())
+        local.depth += 1
+        return PooledConnection(self, local.conn)
+
+    def _release_connection(self):
+        """שחרור חיבור - חוזר למאגר כשאין בו עוד שימוש (בבקשת Flask - בסוף הבקשה)"""
+        local = self._local
+        local.depth -= 1
+        if local.depth <= 0 and not local.request_bound:
+            self._return_thread_connection()
+
+    def _return_thread_connection(self):
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            local.conn = None
+            local.depth = 0
+            self.pool.release(conn)
+
+    @contextmanager
+    def writer(self):
+        """נתיב כתיבה יחיד: כותב אחד בכל פעם, טרנזקציה אחת עם commit בסוף
+
+        קריאות מקוננות באותו thread מצטרפות לטרנזקציה החיצונית.
+        החיבור נלקח מהמאגר לפני הנעילה - כמו בבקשות, שמחזיקות חיבור ורק אז
+        כותבות - אחרת כותב שממתין לחיבור חוסם את כל השאר (lock-order inversion).
+        """
+        conn = self.get_connection()
+        try:
+            with self._write_lock:
+                local = self._local
+                outer = getattr(local, 'write_depth', 0) == 0
+                local.write_depth = getattr(local, 'write_depth', 0) + 1
+                try:
+                    if outer:
+                        conn.execute('BEGIN IMMEDIATE')
+                    yield conn
+                    if outer:
+                        conn.commit()
+                except BaseException:
+                    if outer:
+                        conn.rollback()
+                    raise
+                finally:
+                    local.write_depth -= 1
+        finally:
+            conn.close()
+
+    def teardown(self, exception=None):
+        """החזרת החיבור של הבקשה למאגר בסיום ה-app context"""
+        self._return_thread_connection()
+
+    def close(self):
+        """סגירת כל החיבורים במאגר"""
+        self.activity_log.stop()
+        self._return_thread_connection()
+        self.menu_cache.close()
+        self.pool.close_all()
     
-    def init_database(self):
-        """יצירת טבלאות והכנסת נתונים בסיסיים"""
+    # מיגרציות לפי סדר - מיגרציה מספר N מעלה את PRAGMA user_version ל-N
+    MIGRATIONS = (
+        '_migration_001_base_schema',
+        '_migration_002_hot_path_indexes',
+        '_migration_003_menu_cache_version',
+        '_migration_004_daily_stats_rollup',
+        '_migration_005_orders_updated_index',
+        '_migration_006_payments_order_index',
+        '_migration_007_menu_item_sales',
+        '_migration_008_cart_store',
+        '_migration_009_image_jobs',
+        '_migration_010_image_variants',
+        '_migration_011_image_blobs',
+        '_migration_012_cart_updated_index',
+        '_migration_013_order_events',
+    )
+
+    def get_schema_version(self):
+        """גרסת הסכמה הנוכחית של קובץ מסד הנתונים"""
         conn = self.get_connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        return version
+
+    def init_database(self):
+        """הרצת מיגרציות שטרם הורצו - אם הסכמה עדכנית לא מורץ שום DDL"""
+        if self.get_schema_version() >= len(self.MIGRATIONS):
+            return
+
+        with self.writer() as conn:
+            # קריאה חוזרת בתוך הטרנזקציה - ייתכן שתהליך אחר כבר הריץ מיגרציות
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, name in enumerate(self.MIGRATIONS[version:], start=version + 1):
+                getattr(self, name)(conn)
+                conn.execute(f'PRAGMA user_version = {number}')
+
+    def _migration_001_base_schema(self, conn):
+        """טבלאות הבסיס ונתונים לדוגמה"""
         cursor = conn.cursor()
         
         # יצירת טבלת משתמשים
@@ -117,22 +760,315 @@ class db:
             )
         ''')
         
-        conn.commit()
+        # הוספת עמודת image_filename אם היא לא קיימת (עבור מסדי נתונים קיימים)
+        columns = [row['name'] for row in cursor.execute('PRAGMA table_info(menu_items)')]
+        if 'image_filename' not in columns:
+            cursor.execute("ALTER TABLE menu_items ADD COLUMN image_filename TEXT")
         
         # הוספת נתונים בסיסיים אם הטבלאות ריקות
         cursor.execute("SELECT COUNT(*) FROM users")
         if cursor.fetchone()[0] == 0:
             self.create_sample_data(conn)
+
+    def _migration_002_hot_path_indexes(self, conn):
+        """אינדקסים לשאילתות החמות: היסטוריית לקוח, דשבורד, סטטוס, פריטי הזמנה ולוג"""
+        for statement in (
+            'CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders (customer_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status)',
+            'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)',
+            'CREATE INDEX IF NOT EXISTS idx_activity_logs_user_created ON activity_logs (user_id, created_at)',
+        ):
+            conn.execute(statement)
+
+    def _migration_003_menu_cache_version(self, conn):
+        """מונה גרסת תפריט שמתעדכן בטריגרים - לזיהוי שינויים בתפריט מתהליכים אחרים"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute("INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('menu', 0)")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_menu_items_{event.lower()}_version
+                AFTER {event} ON menu_items
+                BEGIN
+                    UPDATE cache_versions SET version = version + 1 WHERE name = 'menu';
+                END
+            ''')
+
+    def _migration_004_daily_stats_rollup(self, conn):
+        """סיכומים יומיים ומוני סטטוס שמתעדכנים בטריגרים על orders"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                day TEXT PRIMARY KEY,
+                orders_count INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_status_counts (
+                day TEXT NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, status)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS order_status_counts (
+                status TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # מילוי ראשוני מההיסטוריה הקיימת
+        conn.execute('''
+            INSERT OR REPLACE INTO daily_stats (day, orders_count, revenue)
+            SELECT DATE(created_at), COUNT(*), COALESCE(SUM(total_amount), 0)
+            FROM orders GROUP BY DATE(created_at)
+        ''')
+        conn.execute('''
+            INSERT OR REPLACE INTO daily_status_counts (day, status, count)
+            SELECT DATE(created_at), status, COUNT(*)
+            FROM orders GROUP BY DATE(created_at), status
+        ''')
+        conn.execute('''
+            INSERT OR REPLACE INTO order_status_counts (status, count)
+            SELECT status, COUNT(*) FROM orders GROUP BY status
+        ''')
+
+        add_new = '''
+            INSERT INTO daily_stats (day, orders_count, revenue)
+            VALUES (DATE(NEW.created_at), 1, NEW.total_amount)
+            ON CONFLICT (day) DO UPDATE SET
+                orders_count = orders_count + 1,
+                revenue = revenue + excluded.revenue;
+            INSERT INTO daily_status_counts (day, status, count)
+            VALUES (DATE(NEW.created_at), NEW.status, 1)
+            ON CONFLICT (day, status) DO UPDATE SET count = count + 1;
+            INSERT INTO order_status_counts (status, count)
+            VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        '''
+        remove_old = '''
+            UPDATE daily_stats
+            SET orders_count = orders_count - 1, revenue = revenue - OLD.total_amount
+            WHERE day = DATE(OLD.created_at);
+            UPDATE daily_status_counts SET count = count - 1
+            WHERE day = DATE(OLD.created_at) AND status = OLD.status;
+            UPDATE order_status_counts SET count = count - 1
+            WHERE status = OLD.status;
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_stats_insert
+            AFTER INSERT ON orders
+            BEGIN {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_stats_update
+            AFTER UPDATE OF total_amount, status, created_at ON orders
+            BEGIN {remove_old} {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_orders_stats_delete
+            AFTER DELETE ON orders
+            BEGIN {remove_old} END
+        ''')
+    
+    def _migration_005_orders_updated_index(self, conn):
+        """אינדקס לסנכרון דלתא של הדשבורד (הזמנות שהשתנו מאז cursor)"""
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_updated ON orders (updated_at, id)')
+    
+    def _migration_006_payments_order_index(self, conn):
+        """אינדקס לשליפת התשלום של הזמנה (דוחות)"""
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_payments_order ON payments (order_id)')
+    
+    def _migration_007_menu_item_sales(self, conn):
+        """סיכום מכירות לכל פריט תפריט שמתעדכן בטריגרים על order_items (רבי מכר)"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS menu_item_sales (
+                menu_item_id INTEGER PRIMARY KEY,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                orders_count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
         
-        # הוספת עמודת image_filename אם היא לא קיימת (עבור מסדי נתונים קיימים)
-        try:
-            cursor.execute("ALTER TABLE menu_items ADD COLUMN image_filename TEXT")
-            conn.commit()
-        except sqlite3.OperationalError:
-            # העמודה כבר קיימת
-            pass
-            
-        conn.close()
+        # מילוי ראשוני מההיסטוריה הקיימת
+        conn.execute('''
+            INSERT OR REPLACE INTO menu_item_sales (menu_item_id, quantity, revenue, orders_count)
+            SELECT menu_item_id, SUM(quantity), COALESCE(SUM(quantity * price), 0), COUNT(*)
+            FROM order_items GROUP BY menu_item_id
+        ''')
+        
+        add_new = '''
+            INSERT INTO menu_item_sales (menu_item_id, quantity, revenue, orders_count)
+            VALUES (NEW.menu_item_id, NEW.quantity, NEW.quantity * NEW.price, 1)
+            ON CONFLICT (menu_item_id) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                revenue = revenue + excluded.revenue,
+                orders_count = orders_count + 1;
+        '''
+        remove_old = '''
+            UPDATE menu_item_sales
+            SET quantity = quantity - OLD.quantity,
+                revenue = revenue - OLD.quantity * OLD.price,
+                orders_count = orders_count - 1
+            WHERE menu_item_id = OLD.menu_item_id;
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_order_items_sales_insert
+            AFTER INSERT ON order_items
+            BEGIN {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_order_items_sales_update
+            AFTER UPDATE OF menu_item_id, quantity, price ON order_items
+            BEGIN {remove_old} {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_order_items_sales_delete
+            AFTER DELETE ON order_items
+            BEGIN {remove_old} END
+        ''')
+    
+    def _migration_008_cart_store(self, conn):
+        """עגלות קניות בצד השרת, עם כמות וסכום שמתעדכנים בטריגרים על cart_lines"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS carts (
+                cart_id TEXT PRIMARY KEY,
+                item_count INTEGER NOT NULL DEFAULT 0,
+                total REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cart_lines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cart_id TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                special_requests TEXT NOT NULL DEFAULT '',
+                name TEXT NOT NULL,
+                price REAL NOT NULL,
+                quantity INTEGER NOT NULL,
+                UNIQUE (cart_id, item_id, special_requests)
+            )
+        ''')
+        
+        add_new = '''
+            UPDATE carts
+            SET item_count = item_count + NEW.quantity,
+                total = total + NEW.quantity * NEW.price,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE cart_id = NEW.cart_id;
+        '''
+        remove_old = '''
+            UPDATE carts
+            SET item_count = item_count - OLD.quantity,
+                total = total - OLD.quantity * OLD.price,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE cart_id = OLD.cart_id;
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_cart_lines_insert
+            AFTER INSERT ON cart_lines
+            BEGIN {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_cart_lines_update
+            AFTER UPDATE OF quantity, price ON cart_lines
+            BEGIN {remove_old} {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_cart_lines_delete
+            AFTER DELETE ON cart_lines
+            BEGIN {remove_old} END
+        ''')
+    
+    def _migration_009_image_jobs(self, conn):
+        """מצב עבודות עיבוד תמונה שרצות ברקע"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS image_jobs (
+                id TEXT PRIMARY KEY,
+                menu_item_id INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (menu_item_id) REFERENCES menu_items (id)
+            )
+        ''')
+    
+    def _migration_010_image_variants(self, conn):
+        """תיאור גרסאות התמונה של כל פריט (רוחבים ופורמטים) כ-JSON"""
+        columns = [row['name'] for row in conn.execute('PRAGMA table_info(menu_items)')]
+        if 'image_variants' not in columns:
+            conn.execute('ALTER TABLE menu_items ADD COLUMN image_variants TEXT')
+    
+    def _migration_011_image_blobs(self, conn):
+        """מאגר תמונות לפי hash של התוכן, עם מונה הפניות מ-menu_items.image_filename
+
+        source_hash - hash של הקובץ שהועלה, כדי שהעלאה זהה לא תעובד שוב.
+        refcount מתעדכן בטריגרים; תמונה עם refcount 0 נמחקת באיסוף זבל.
+        """
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS image_blobs (
+                filename TEXT PRIMARY KEY,
+                source_hash TEXT UNIQUE,
+                image_variants TEXT,
+                refcount INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_image_blobs_unreferenced ON image_blobs (refcount) WHERE refcount <= 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_menu_items_image ON menu_items (image_filename)')
+        
+        add_new = '''
+            UPDATE image_blobs SET refcount = refcount + 1 WHERE filename = NEW.image_filename;
+        '''
+        remove_old = '''
+            UPDATE image_blobs SET refcount = refcount - 1 WHERE filename = OLD.image_filename;
+        '''
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_menu_items_image_ref_insert
+            AFTER INSERT ON menu_items
+            WHEN NEW.image_filename IS NOT NULL
+            BEGIN {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_menu_items_image_ref_update
+            AFTER UPDATE OF image_filename ON menu_items
+            WHEN OLD.image_filename IS NOT NEW.image_filename
+            BEGIN {remove_old} {add_new} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_menu_items_image_ref_delete
+            AFTER DELETE ON menu_items
+            WHEN OLD.image_filename IS NOT NULL
+            BEGIN {remove_old} END
+        ''')
+    
+    def _migration_012_cart_updated_index(self, conn):
+        """אינדקס למחיקת עגלות ישנות (SqliteCartStore.prune)"""
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_carts_updated ON carts (updated_at)')
+    
+    def _migration_013_order_events(self, conn):
+        """יומן אירועי הזמנות לערוץ ה-SSE - seq משותף לכל תהליכי השרת (OrderEventHub)"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS order_events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                order_id INTEGER NOT NULL,
+                customer_id INTEGER NOT NULL,
+                order_number TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total_amount REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
     
     def create_sample_data(self, conn):
         """יצירת נתונים לדוגמה"""
@@ -169,27 +1105,21 @@ class db:
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', item)
         
-        conn.commit()
         print("נתונים לדוגמה נוצרו בהצלחה!")
     
     # פונקציות למשתמשים
     def create_user(self, username, email, password, role='customer', phone='', address=''):
         """יצירת משתמש חדש"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO users (username, email, password, role, phone, address)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (username, email, password, role, phone, address))
-            
-            user_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return user_id
+            with self.writer() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO users (username, email, password, role, phone, address)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (username, email, password, role, phone, address))
+                
+                return cursor.lastrowid
         except sqlite3.IntegrityError:
-            conn.close()
             return None
     
     def authenticate_user(self, username, password):
@@ -225,130 +1155,433 @@ class db:
         return dict(user) if user else None
     
     # פונקציות לתפריט
-    def get_menu_items(self, category=None, available_only=True):
-        """קבלת פריטי תפריט"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        query = 'SELECT * FROM menu_items'
-        params = []
+    def get_menu_items(self, category=None, available_only=True, compact=False):
+        """קבלת פריטי תפריט (מהמטמון)
+
+        compact=True מחזיר רשומות Record משותפות מהמטמון, בלי יצירת dict לכל פריט.
+        """
+        menu = self.menu_cache.snapshot()
         
-        conditions = []
-        if available_only:
-            conditions.append('is_available = 1')
         if category:
-            conditions.append('category = ?')
-            params.append(category)
+            source = menu['available_by_category' if available_only else 'by_category'].get(category, [])
+        else:
+            source = menu['available' if available_only else 'items']
         
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
+        if compact:
+            records = menu['compact']
+            return [records[item['id']] for item in source]
         
-        query += ' ORDER BY category, name'
+        # העתקים - הקוראים רשאים לשנות את הרשומות שקיבלו
+        return [dict(item) for item in source]
+    
+    def get_menu_categories(self):
+        """קבלת קטגוריות תפריט (מהמטמון)"""
+        return list(self.menu_cache.snapshot()['categories'])
+    
+    def get_menu_item_by_id(self, item_id, compact=False):
+        """קבלת פריט תפריט לפי ID (מהמטמון)"""
+        menu = self.menu_cache.snapshot()
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
         
-        cursor.execute(query, params)
-        items = cursor.fetchall()
-        conn.close()
+        if compact:
+            return menu['compact'].get(item_id)
         
+        item = menu['by_id'].get(item_id)
+        return dict(item) if item else None
+    
+    def get_menu_version(self):
+        """מספר גרסת התפריט - משתנה בכל שינוי בתפריט"""
+        return self.menu_cache.snapshot()['version']
+    
+    def get_menu_stats(self):
+        """ספירת פריטים לפי זמינות וקטגוריה (מהמטמון - בלי שאילתה)"""
+        return self.menu_cache.snapshot()['stats']
+    
+    def get_recent_menu_items(self, limit=5, compact=False):
+        """פריטים שעודכנו לאחרונה לפי updated_at (מהמטמון)"""
+        menu = self.menu_cache.snapshot()
+        items = menu['recent'][:limit]
+        if compact:
+            return [menu['compact'][item['id']] for item in items]
         return [dict(item) for item in items]
     
-    def get_menu_categories(self):
-        """קבלת קטגוריות תפריט"""
+    def get_best_sellers(self, limit=5):
+        """רבי מכר מטבלת הסיכום menu_item_sales (כולל הזמנות שבוטלו)"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute('SELECT DISTINCT category FROM menu_items WHERE is_available = 1')
-        categories = cursor.fetchall()
+        cursor.execute('''
+            SELECT s.menu_item_id, mi.name, mi.category, s.quantity, s.revenue, s.orders_count
+            FROM menu_item_sales s
+            JOIN menu_items mi ON mi.id = s.menu_item_id
+            WHERE s.quantity > 0
+            ORDER BY s.quantity DESC, s.revenue DESC
+            LIMIT ?
+        ''', (limit,))
+        best_sellers = [dict(row) for row in cursor.fetchall()]
         conn.close()
+        return best_sellers
+    
+    def update_menu_item_image(self, item_id, image_filename, image_variants=None):
+        """עדכון תמונה של פריט תפריט (image_variants - dict הגרסאות, אם יש)"""
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE menu_items 
+                SET image_filename = ?, image_variants = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (image_filename, json.dumps(image_variants) if image_variants else None, item_id))
+            
+            success = cursor.rowcount > 0
         
-        return [cat['category'] for cat in categories]
+        self.menu_cache.invalidate()
+        return success
     
-    def get_menu_item_by_id(self, item_id):
-        """קבלת פריט תפריט לפי ID"""
+    def get_menu_item_image(self, item_id):
+        """(image_filename, image_variants) ישירות מהמסד - לא מהמטמון"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM menu_items WHERE id = ?', (item_id,))
-        item = cursor.fetchone()
+        row = conn.execute(
+            'SELECT image_filename, image_variants FROM menu_items WHERE id = ?', (item_id,)
+        ).fetchone()
         conn.close()
-        
-        return dict(item) if item else None
+        return (row['image_filename'], parse_json(row['image_variants'])) if row else (None, None)
     
-    def update_menu_item_image(self, item_id, image_filename):
-        """עדכון תמונה של פריט תפריט"""
+    def count_menu_items_with_image(self, image_filename):
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE menu_items 
-            SET image_filename = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (image_filename, item_id))
-        
-        conn.commit()
-        success = cursor.rowcount > 0
+        count = conn.execute(
+            'SELECT COUNT(*) FROM menu_items WHERE image_filename = ?', (image_filename,)
+        ).fetchone()[0]
         conn.close()
-        return success
+        return count
+    
+    # מאגר התמונות (לפי hash)
+    def get_image_blob_by_source(self, source_hash):
+        """תמונה מעובדת שכבר נוצרה מאותו קובץ מקור, או None"""
+        conn = self.get_connection()
+        row = conn.execute('''
+            SELECT filename, source_hash, image_variants, refcount
+            FROM image_blobs WHERE source_hash = ?
+        ''', (source_hash,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        blob = dict(row)
+        blob['image_variants'] = parse_json(blob['image_variants'])
+        return blob
+    
+    def add_image_blob(self, filename, source_hash, image_variants):
+        """רישום תמונה במאגר (אם כבר קיימת - ללא שינוי)"""
+        with self.writer() as conn:
+            if source_hash:
+                # עיבוד חדש של אותו מקור (למשל אחרי שינוי הגדרות איכות) מחליף את הקודם
+                conn.execute(
+                    'UPDATE image_blobs SET source_hash = NULL WHERE source_hash = ? AND filename != ?',
+                    (source_hash, filename)
+                )
+            conn.execute('''
+                INSERT OR IGNORE INTO image_blobs (filename, source_hash, image_variants)
+                VALUES (?, ?, ?)
+            ''', (filename, source_hash, json.dumps(image_variants) if image_variants else None))
+            if source_hash:
+                # אותה תמונה מעובדת ממקור אחר - מקור אחד נשמר לכל תמונה
+                conn.execute('''
+                    UPDATE image_blobs SET source_hash = ?
+                    WHERE filename = ? AND source_hash IS NULL
+                      AND NOT EXISTS (SELECT 1 FROM image_blobs WHERE source_hash = ?)
+                ''', (source_hash, filename, source_hash))
+    
+    def delete_unreferenced_image_blobs(self):
+        """מחיקת תמונות שאף פריט לא מפנה אליהן - מחזיר [(filename, variants)] למחיקת הקבצים"""
+        with self.writer() as conn:
+            rows = conn.execute(
+                'SELECT filename, image_variants FROM image_blobs WHERE refcount <= 0'
+            ).fetchall()
+            conn.execute('DELETE FROM image_blobs WHERE refcount <= 0')
+        return [(row['filename'], parse_json(row['image_variants'])) for row in rows]
+    
+    # עבודות עיבוד תמונה
+    def create_image_job(self, job_id, item_id, filename):
+        with self.writer() as conn:
+            conn.execute(
+                'INSERT INTO image_jobs (id, menu_item_id, filename) VALUES (?, ?, ?)',
+                (job_id, item_id, filename)
+            )
+    
+    def update_image_job(self, job_id, status, error=None, filename=None):
+        with self.writer() as conn:
+            conn.execute('''
+                UPDATE image_jobs
+                SET status = ?, error = ?, filename = COALESCE(?, filename), updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, error, filename, job_id))
+    
+    def get_image_job(self, job_id):
+        conn = self.get_connection()
+        row = conn.execute('''
+            SELECT id, menu_item_id, filename, status, error, created_at, updated_at
+            FROM image_jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        conn.close()
+        return dict(row) if row else None
     
     def add_menu_item(self, name, description, price, category, image_filename=None):
         """הוספת פריט תפריט חדש"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO menu_items (name, description, price, category, image_filename)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (name, description, price, category, image_filename))
+            
+            item_id = cursor.lastrowid
         
-        cursor.execute('''
-            INSERT INTO menu_items (name, description, price, category, image_filename)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (name, description, price, category, image_filename))
+        self.menu_cache.invalidate()
+        return item_id
+    
+    # פעולות מרוכזות על התפריט - טרנזקציה אחת וביטול מטמון אחד לכל מנה
+    # מגבלת פרמטרים ל-IN (...) - מתחת לברירת המחדל של גרסאות SQLite ישנות (999)
+    BULK_CHUNK_SIZE = 500
+    
+    def bulk_set_availability(self, available, item_ids=None):
+        """קביעת זמינות לכמה פריטים (item_ids=None - לכל התפריט). מחזיר מספר פריטים שעודכנו"""
+        with self.writer() as conn:
+            updated = self._bulk_set_column(conn, 'is_available', 1 if available else 0, item_ids)
         
-        item_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        self.menu_cache.invalidate()
+        return updated
+    
+    def bulk_set_category(self, item_ids, category):
+        """העברת כמה פריטים לקטגוריה אחרת"""
+        category = self._valid_category(category)
+        with self.writer() as conn:
+            updated = self._bulk_set_column(conn, 'category', category, item_ids)
+        
+        self.menu_cache.invalidate()
+        return updated
+    
+    def bulk_update_prices(self, prices):
+        """עדכון מחירים - prices הוא {item_id: price}"""
+        with self.writer() as conn:
+            updated = self._bulk_update_prices(conn, prices)
+        
+        self.menu_cache.invalidate()
+        return updated
+    
+    def bulk_edit_menu_items(self, edits):
+        """עריכה מרוכזת: edits היא רשימת {'id', ואופציונלית 'price', 'category', 'is_available'}
+
+        הכל בטרנזקציה אחת; פריטים עם אותו שינוי מקובצים לפקודת UPDATE אחת.
+        מחזיר את מספר הפריטים (לא השדות) שעודכנו. מחיר שלילי או לא סופי, קטגוריה
+        ריקה או id מחוץ לטווח INTEGER של SQLite - ValueError.
+        """
+        prices = {}
+        by_category = {}
+        by_availability = {}
+        edited = set()
+        for edit in edits:
+            item_id = self._valid_id(edit['id'])
+            if 'price' in edit:
+                prices[item_id] = self._valid_price(edit['price'])
+            if 'category' in edit:
+                by_category.setdefault(self._valid_category(edit['category']), []).append(item_id)
+            if 'is_available' in edit:
+                by_availability.setdefault(1 if edit['is_available'] else 0, []).append(item_id)
+            if edit.keys() & {'price', 'category', 'is_available'}:
+                edited.add(item_id)
+        
+        with self.writer() as conn:
+            if prices:
+                self._bulk_update_prices(conn, prices)
+            for category, item_ids in by_category.items():
+                self._bulk_set_column(conn, 'category', category, item_ids)
+            for available, item_ids in by_availability.items():
+                self._bulk_set_column(conn, 'is_available', available, item_ids)
+            updated = self._count_menu_items(conn, edited)
+        
+        self.menu_cache.invalidate()
+        return updated
+    
+    @staticmethod
+    def _valid_price(price):
+        price = float(price)
+        if not math.isfinite(price) or price < 0:
+            raise ValueError(f'מחיר לא תקין: {price}')
+        return price
+    
+    @staticmethod
+    def _valid_id(item_id):
+        try:
+            item_id = int(item_id)
+        except OverflowError:  # int(float('inf'))
+            raise ValueError(f'מזהה לא תקין: {item_id}')
+        if not -2 ** 63 <= item_id < 2 ** 63:
+            raise ValueError(f'מזהה לא תקין: {item_id}')
         return item_id
     
+    @staticmethod
+    def _valid_category(category):
+        # כמו בהוספת פריט: מחרוזת לא ריקה אחרי strip
+        if not isinstance(category, str) or not category.strip():
+            raise ValueError('קטגוריה לא תקינה')
+        return category.strip()
+    
+    def _count_menu_items(self, conn, item_ids):
+        """כמה מה-ids קיימים בטבלה (בחלקים, כמו _bulk_set_column)"""
+        item_ids = list(item_ids)
+        count = 0
+        for start in range(0, len(item_ids), self.BULK_CHUNK_SIZE):
+            chunk = item_ids[start:start + self.BULK_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            count += conn.execute(
+                f'SELECT COUNT(*) FROM menu_items WHERE id IN ({placeholders})', chunk
+            ).fetchone()[0]
+        return count
+    
+    def _bulk_set_column(self, conn, column, value, item_ids):
+        """UPDATE ... WHERE id IN (...) בחלקים; column מגיע מהקוד בלבד, לא מהמשתמש"""
+        if item_ids is None:
+            return conn.execute(
+                f'UPDATE menu_items SET {column} = ?, updated_at = CURRENT_TIMESTAMP',
+                (value,)
+            ).rowcount
+        
+        item_ids = [self._valid_id(item_id) for item_id in item_ids]
+        updated = 0
+        for start in range(0, len(item_ids), self.BULK_CHUNK_SIZE):
+            chunk = item_ids[start:start + self.BULK_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            updated += conn.execute(
+                f'UPDATE menu_items SET {column} = ?, updated_at = CURRENT_TIMESTAMP WHERE id IN ({placeholders})',
+                [value, *chunk]
+            ).rowcount
+        return updated
+    
+    def _bulk_update_prices(self, conn, prices):
+        cursor = conn.cursor()
+        cursor.executemany(
+            'UPDATE menu_items SET price = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            [(self._valid_price(price), self._valid_id(item_id)) for item_id, price in prices.items()]
+        )
+        return cursor.rowcount
+    
     # פונקציות להזמנות
     def create_order(self, customer_id, delivery_address='', delivery_phone='', special_instructions=''):
         """יצירת הזמנה חדשה"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         # יצירת מספר הזמנה ייחודי
         import random
         order_number = f"ROL{datetime.now().strftime('%Y%m%d')}{random.randint(1000, 9999)}"
         
-        cursor.execute('''
-            INSERT INTO orders (customer_id, order_number, delivery_address, delivery_phone, special_instructions)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (customer_id, order_number, delivery_address, delivery_phone, special_instructions))
-        
-        order_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO orders (customer_id, order_number, delivery_address, delivery_phone, special_instructions)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (customer_id, order_number, delivery_address, delivery_phone, special_instructions))
+            
+            order_id = cursor.lastrowid
+            self.events.publish(conn, 'order_created', self._order_event_row(conn, order_id))
         
+        self.events.notify()
         return order_id, order_number
     
     def add_order_item(self, order_id, menu_item_id, quantity, special_requests=''):
         """הוספת פריט להזמנה"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # קבלת מחיר הפריט
-        cursor.execute('SELECT price FROM menu_items WHERE id = ?', (menu_item_id,))
-        price_row = cursor.fetchone()
-        
-        if not price_row:
-            conn.close()
-            return False
-        
-        price = price_row['price']
-        
-        cursor.execute('''
-            INSERT INTO order_items (order_id, menu_item_id, quantity, price, special_requests)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (order_id, menu_item_id, quantity, price, special_requests))
-        
-        conn.commit()
-        conn.close()
-        return True
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            
+            # קבלת מחיר הפריט
+            cursor.execute('SELECT price FROM menu_items WHERE id = ?', (menu_item_id,))
+            price_row = cursor.fetchone()
+            
+            if not price_row:
+                return False
+            
+            price = price_row['price']
+            
+            cursor.execute('''
+                INSERT INTO order_items (order_id, menu_item_id, quantity, price, special_requests)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (order_id, menu_item_id, quantity, price, special_requests))
+            
+            return True
     
+    def place_order(self, customer_id, cart, delivery_address='', delivery_phone='',
+                    special_instructions='', payment_method='credit_card', transaction_id='',
+                    ip_address=''):
+        """ביצוע הזמנה מלאה בטרנזקציה אחת: הזמנה, פריטים, סכום, תשלום, סטטוס ולוג
+
+        מחזיר (order_id, order_number, total_amount), או None אם אף פריט בעגלה לא נמצא בתפריט.
+        """
+        item_ids = list({int(line['id']) for line in cart})
+        if not item_ids:
+            return None
+
+        import random
+        order_number = f"ROL{datetime.now().strftime('%Y%m%d')}{random.randint(1000, 9999)}"
+
+        with self.writer() as conn:
+            cursor = conn.cursor()
+
+            # כל המחירים בשאילתה אחת
+            placeholders = ', '.join('?' * len(item_ids))
+            cursor.execute(f'SELECT id, price FROM menu_items WHERE id IN ({placeholders})', item_ids)
+            prices = {row['id']: row['price'] for row in cursor.fetchall()}
+
+            if not prices:
+                return None
+
+            cursor.execute('''
+                INSERT INTO orders (customer_id, order_number, delivery_address, delivery_phone, special_instructions)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (customer_id, order_number, delivery_address, delivery_phone, special_instructions))
+            order_id = cursor.lastrowid
+
+            # פריטים שלא נמצאו בתפריט מדולגים, כמו ב-add_order_item
+            cursor.executemany('''
+                INSERT INTO order_items (order_id, menu_item_id, quantity, price, special_requests)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [
+                (order_id, int(line['id']), line['quantity'], prices[int(line['id'])], line.get('special_requests', ''))
+                for line in cart if int(line['id']) in prices
+            ])
+
+            # סכום כולל וסטטוס באותה פקודה
+            cursor.execute('''
+                UPDATE orders
+                SET total_amount = (
+                        SELECT COALESCE(SUM(quantity * price), 0)
+                        FROM order_items WHERE order_id = ?
+                    ),
+                    status = 'confirmed',
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (order_id, order_id))
+
+            cursor.execute('''
+                INSERT INTO payments (order_id, amount, payment_method, transaction_id, status)
+                SELECT id, total_amount, ?, ?, 'completed' FROM orders WHERE id = ?
+            ''', (payment_method, transaction_id, order_id))
+
+            cursor.execute('SELECT total_amount FROM orders WHERE id = ?', (order_id,))
+            total_amount = cursor.fetchone()['total_amount']
+
+            self.log_activity(customer_id, 'order_created', f'Order {order_number} created', ip_address)
+            self.events.publish(conn, 'order_created', self._order_event_row(conn, order_id))
+
+        # המנויים מתעוררים רק אחרי commit
+        self.events.notify()
+        return order_id, order_number, total_amount
+
+    def _order_event_row(self, conn, order_id):
+        """השדות של הזמנה שנשלחים באירועי הזמנות"""
+        row = conn.execute('''
+            SELECT id, customer_id, order_number, status, total_amount
+            FROM orders WHERE id = ?
+        ''', (order_id,)).fetchone()
+        return dict(row) if row else None
+
     def get_order_by_id(self, order_id):
         """קבלת הזמנה לפי ID"""
         conn = self.get_connection()
@@ -385,109 +1618,267 @@ class db:
     
     def update_order_total(self, order_id):
         """עדכון סכום כולל של הזמנה"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT SUM(quantity * price) as total
-            FROM order_items
-            WHERE order_id = ?
-        ''', (order_id,))
-        
-        total = cursor.fetchone()['total'] or 0
-        
-        cursor.execute('''
-            UPDATE orders SET total_amount = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (total, order_id))
-        
-        conn.commit()
-        conn.close()
-        return total
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT SUM(quantity * price) as total
+                FROM order_items
+                WHERE order_id = ?
+            ''', (order_id,))
+            
+            total = cursor.fetchone()['total'] or 0
+            
+            cursor.execute('''
+                UPDATE orders SET total_amount = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (total, order_id))
+            
+            return total
     
-    def get_orders_by_customer(self, customer_id):
-        """קבלת הזמנות לקוח"""
+    def get_orders_by_customer(self, customer_id, limit=None):
+        """קבלת הזמנות לקוח (כולן, או limit האחרונות)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT * FROM orders 
             WHERE customer_id = ? 
-            ORDER BY created_at DESC
-        ''', (customer_id,))
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (customer_id, -1 if limit is None else limit))
         
         orders = cursor.fetchall()
         conn.close()
         
         return [dict(order) for order in orders]
     
-    def update_order_status(self, order_id, status):
-        """עדכון סטטוס הזמנה"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def get_customer_orders_page(self, customer_id, limit=20, cursor=None, compact=False):
+        """עמוד מהיסטוריית ההזמנות של לקוח בדפדוף keyset על (created_at, id)
+
+        מחזיר (orders, next_cursor); next_cursor הוא None בעמוד האחרון.
+        """
+        position = decode_cursor(cursor)
+        query = 'SELECT * FROM orders WHERE customer_id = ?'
+        params = [customer_id]
+        if position:
+            query += ' AND (created_at, id) < (?, ?)'
+            params.extend(position)
+        query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        params.append(limit + 1)
+        
+        return self._page(self._fetch(query, params, compact), limit)
+    
+    def get_recent_orders(self, limit=10, cursor=None, compact=False):
+        """ההזמנות האחרונות בכל המערכת (לדשבורד) בדפדוף keyset
+
+        מחזיר (orders, next_cursor).
+        """
+        position = decode_cursor(cursor)
+        query = '''
+            SELECT o.*, u.username 
+            FROM orders o 
+            JOIN users u ON o.customer_id = u.id 
+        '''
+        params = []
+        if position:
+            query += ' WHERE (o.created_at, o.id) < (?, ?)'
+            params.extend(position)
+        query += ' ORDER BY o.created_at DESC, o.id DESC LIMIT ?'
+        params.append(limit + 1)
         
-        cursor.execute('''
-            UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (status, order_id))
+        return self._page(self._fetch(query, params, compact), limit)
+    
+    def get_orders_changed_since(self, cursor, limit=50):
+        """הזמנות שנוצרו או השתנו אחרי cursor, לפי (updated_at, id)
+
+        מחזיר (orders, next_cursor). updated_at ברזולוציה של שנייה, לכן ה-cursor
+        לא מתקדם אל תוך השנייה הנוכחית: שורות ממנה יישלחו שוב בבדיקה הבאה
+        (הלקוח מעדכן לפי id), ושינוי מאוחר באותה שנייה לא יפוספס.
+        """
+        position = decode_cursor(cursor)
+        if position is None:
+            raise ValueError('cursor לא תקין')
+        
+        rows = self._fetch('''
+            SELECT o.*, u.username 
+            FROM orders o 
+            JOIN users u ON o.customer_id = u.id 
+            WHERE (o.updated_at, o.id) > (?, ?)
+            ORDER BY o.updated_at, o.id
+            LIMIT ?
+        ''', [*position, limit])
+        
+        current_second = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        next_cursor = cursor
+        for row in rows:
+            if row['updated_at'] >= current_second:
+                break
+            next_cursor = encode_cursor(row['updated_at'], row['id'])
+        return rows, next_cursor
+    
+    # עמודות דוח ההזמנות - שורה לכל פריט בהזמנה
+    REPORT_COLUMNS = (
+        'order_id', 'order_number', 'created_at', 'status', 'customer', 'customer_email',
+        'total_amount', 'item_id', 'item_name', 'category', 'quantity', 'unit_price',
+        'special_requests', 'payment_method', 'payment_status', 'transaction_id',
+    )
+    
+    def iter_order_report(self, start_date=None, end_date=None, chunk_size=500):
+        """דוח הזמנות בזרימה: מחזיר גנרטור של מנות (רשימות tuple) מ-fetchmany
+
+        זיכרון קבוע בלי תלות בטווח התאריכים. החיבור נלקח ישירות מהמאגר ולא
+        מה-thread, כי הגנרטור נצרך גם אחרי סיום הבקשה (תשובת Flask בזרימה).
+        end_date כולל את היום עצמו.
+        """
+        query = '''
+            SELECT o.id, o.order_number, o.created_at, o.status, u.username, u.email,
+                   o.total_amount, oi.menu_item_id, mi.name, mi.category, oi.quantity, oi.price,
+                   oi.special_requests, p.payment_method, p.status, p.transaction_id
+            FROM orders o
+            JOIN users u ON u.id = o.customer_id
+            LEFT JOIN order_items oi ON oi.order_id = o.id
+            LEFT JOIN menu_items mi ON mi.id = oi.menu_item_id
+            LEFT JOIN payments p ON p.id = (SELECT MAX(id) FROM payments WHERE order_id = o.id)
+        '''
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append('o.created_at >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append("o.created_at < DATE(?, '+1 day')")
+            params.append(end_date)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY o.created_at, o.id, oi.id'
         
-        conn.commit()
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None  # tuple גולמי - בלי sqlite3.Row לכל שורה
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            self.pool.release(conn)
+    
+    def get_orders_sync_cursor(self):
+        """cursor שמצביע על השינוי האחרון בהזמנות - נקודת התחלה לסנכרון דלתא"""
+        conn = self.get_connection()
+        row = conn.execute('''
+            SELECT updated_at, id FROM orders
+            WHERE updated_at < ?
+            ORDER BY updated_at DESC, id DESC LIMIT 1
+        ''', (datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),)).fetchone()
         conn.close()
-        return cursor.rowcount > 0
+        return encode_cursor(row['updated_at'], row['id']) if row else encode_cursor('', 0)
     
-    # פונקציות לתשלומים
-    def create_payment(self, order_id, amount, payment_method, transaction_id=''):
-        """יצירת תשלום"""
+    def _fetch(self, query, params, compact=False):
+        """הרצת שאילתת קריאה - רשומות Record במצב compact, אחרת dict"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO payments (order_id, amount, payment_method, transaction_id, status)
-            VALUES (?, ?, ?, ?, 'completed')
-        ''', (order_id, amount, payment_method, transaction_id))
-        
-        payment_id = cursor.lastrowid
-        conn.commit()
+        if compact:
+            cursor.row_factory = compact_row_factory
+        rows = cursor.execute(query, params).fetchall()
         conn.close()
         
-        return payment_id
+        return rows if compact else [dict(row) for row in rows]
+    
+    def _page(self, rows, limit):
+        """חיתוך תוצאה של limit+1 שורות לעמוד ו-cursor לעמוד הבא"""
+        orders = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = orders[-1]
+            created_at = last['created_at']
+            if isinstance(created_at, datetime):
+                created_at = created_at.isoformat(sep=' ')
+            next_cursor = encode_cursor(created_at, last['id'])
+        return orders, next_cursor
+    
+    def get_latest_order(self, customer_id):
+        """ההזמנה האחרונה של לקוח - שורה אחת מהאינדקס"""
+        orders = self.get_orders_by_customer(customer_id, limit=1)
+        return orders[0] if orders else None
+    
+    def update_order_status(self, order_id, status):
+        """עדכון סטטוס הזמנה"""
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (status, order_id))
+            
+            if cursor.rowcount == 0:
+                return False
+            self.events.publish(conn, 'order_status', self._order_event_row(conn, order_id))
+        
+        self.events.notify()
+        return True
+    
+    # פונקציות לתשלומים
+    def create_payment(self, order_id, amount, payment_method, transaction_id=''):
+        """יצירת תשלום"""
+        with self.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO payments (order_id, amount, payment_method, transaction_id, status)
+                VALUES (?, ?, ?, ?, 'completed')
+            ''', (order_id, amount, payment_method, transaction_id))
+            
+            return cursor.lastrowid
     
     # פונקציות סטטיסטיקה
     def get_today_stats(self):
-        """סטטיסטיקות היום"""
+        """סטטיסטיקות היום - קריאה מהסיכום היומי, בלי סריקה של orders"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        stats = self.get_daily_stats(today)
+        
+        return {
+            'orders_today': stats['orders_count'],
+            'revenue_today': stats['revenue'],
+            'pending_orders': self.get_status_count('pending'),
+            'status_today': stats['statuses'],
+        }
+    
+    def get_daily_stats(self, day):
+        """סיכום יום: מספר הזמנות, הכנסות ומונה לכל סטטוס"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        today = datetime.now().strftime('%Y-%m-%d')
+        cursor.execute('SELECT orders_count, revenue FROM daily_stats WHERE day = ?', (day,))
+        row = cursor.fetchone()
         
         cursor.execute('''
-            SELECT 
-                COUNT(*) as orders_today,
-                COALESCE(SUM(total_amount), 0) as revenue_today
-            FROM orders 
-            WHERE DATE(created_at) = ?
-        ''', (today,))
-        
-        stats = dict(cursor.fetchone())
-        
-        cursor.execute("SELECT COUNT(*) as pending_orders FROM orders WHERE status = 'pending'")
-        stats.update(dict(cursor.fetchone()))
+            SELECT status, count FROM daily_status_counts
+            WHERE day = ? AND count > 0
+        ''', (day,))
+        statuses = {r['status']: r['count'] for r in cursor.fetchall()}
         
         conn.close()
-        return stats
+        return {
+            'day': day,
+            'orders_count': row['orders_count'] if row else 0,
+            'revenue': round(row['revenue'], 2) if row else 0,
+            'statuses': statuses,
+        }
     
-    def log_activity(self, user_id, action, description, ip_address=''):
-        """רישום פעילות"""
+    def get_status_count(self, status):
+        """מספר ההזמנות הנוכחי בסטטוס מסוים"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO activity_logs (user_id, action, description, ip_address)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, action, description, ip_address))
-        
-        conn.commit()
+        row = conn.execute('SELECT count FROM order_status_counts WHERE status = ?', (status,)).fetchone()
         conn.close()
+        return row['count'] if row else 0
+    
+    def log_activity(self, user_id, action, description, ip_address=''):
+        """רישום פעילות - נכתב ברקע במנות ע"י activity_log"""
+        # זמן הרישום נלקח עכשיו (UTC, כמו CURRENT_TIMESTAMP) ולא בזמן הכתיבה
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self.activity_log.submit((user_id, action, description, ip_address, created_at))
 
 # יצירת אינסטנס גלובלי
 database = db()
\ No newline at end of file
@@ -0,0 +1,122 @@
+# events.py
+import threading
+import time
+
+
+class OrderEventHub:
+    """אירועי הזמנות (יצירה ושינוי סטטוס) לערוץ ה-SSE - משותפים לכל התהליכים
+
+    כל אירוע נכתב לטבלת order_events באותה טרנזקציה של השינוי בהזמנה
+    (מיגרציה 013), ומזהה האירוע הוא ה-seq שלו בטבלה. כך הזמנה שנוצרה ב-worker
+    אחד מגיעה גם למנויים ב-workers אחרים, ו-Last-Event-ID תקף בכל תהליך.
+
+    המנויים ממתינים על Condition. לכל היותר פעם ב-poll_interval מנוי אחד בודק
+    את ה-seq האחרון במסד - שאילתה אחת לתהליך, לא לכל מנוי - ומעיר את כולם אם
+    נוסף אירוע; אירוע מהתהליך הנוכחי מעיר אותם מיד (notify). תחת gevent
+    (gunicorn.conf.py) ההמתנה משחררת את ה-worker לבקשות אחרות.
+    """
+
+    def __init__(self, database, poll_interval=1.0, history=1000):
+        self.db = database
+        self.poll_interval = poll_interval
+        self.history = history
+        self._cond = threading.Condition()
+        self._latest = None
+        self._checked_at = 0.0
+
+    def publish(self, conn, event_type, order):
+        """רישום אירוע בטרנזקציה של הקורא (conn מ-db.writer()) - מחזיר את ה-seq
+
+        order - dict עם id, customer_id, order_number, status, total_amount.
+        המנויים בתהליך הזה מתעוררים ב-notify(), אחרי commit.
+        """
+        seq = conn.execute('''
+            INSERT INTO order_events (type, order_id, customer_id, order_number, status, total_amount)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (event_type, order['id'], order['customer_id'], order['order_number'],
+              order['status'], order['total_amount'])).lastrowid
+        if seq % 100 == 0:
+            # נשמרים רק history האירועים האחרונים - מנוי שפיגר יותר מקבל resync
+            conn.execute('DELETE FROM order_events WHERE seq <= ?', (seq - self.history,))
+        return seq
+
+    def notify(self):
+        """הערת המנויים בתהליך אחרי commit של אירוע"""
+        with self._cond:
+            self._checked_at = 0.0
+            self._cond.notify_all()
+
+    def _refresh(self, force=False):
+        """ה-seq האחרון - מהמסד לכל היותר פעם ב-poll_interval
+
+        השאילתה רצה מחוץ ל-_cond: מנוי שממתין לחיבור מהמאגר לא חוסם את
+        notify() של כותב שסיים commit. _cond נתפס רק לעדכון התוצאה.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if not (force or self._latest is None or now - self._checked_at >= self.poll_interval):
+                return self._latest
+            # מנוי אחד שואל; האחרים ממשיכים להמתין לתוצאה או ל-notify
+            self._checked_at = now
+
+        conn = self.db.get_connection()
+        try:
+            latest = conn.execute('SELECT MAX(seq) FROM order_events').fetchone()[0] or 0
+        finally:
+            conn.close()
+
+        with self._cond:
+            if self._latest is None or latest > self._latest:
+                if self._latest is not None:
+                    self._cond.notify_all()
+                self._latest = latest
+            return self._latest
+
+    @property
+    def last_seq(self):
+        return self._refresh(force=True)
+
+    def resolve(self, last_event_id):
+        """המרת Last-Event-ID למספר רצף, או None אם אי אפשר להמשיך ממנו (נדרש resync)"""
+        latest = self.last_seq
+        if not last_event_id:
+            return latest
+        if not last_event_id.isdigit():
+            return None
+        seq = int(last_event_id)
+        conn = self.db.get_connection()
+        try:
+            oldest = conn.execute('SELECT MIN(seq) FROM order_events').fetchone()[0]
+        finally:
+            conn.close()
+        if seq > latest or (oldest is not None and seq < oldest - 1):
+            return None
+        return seq
+
+    def wait(self, after_seq, timeout):
+        """אירועים שאחרי after_seq; ממתין עד timeout שניות אם אין כאלה
+
+        מחזיר רשימה (ריקה אם עבר הזמן), או None אם המנוי פיגר מעבר להיסטוריה.
+        """
+        deadline = time.monotonic() + timeout
+        while self._refresh() <= after_seq:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            with self._cond:
+                # notify() מאפס את _checked_at - אם קרה מאז הבדיקה, בודקים שוב מיד
+                if self._checked_at and self._latest <= after_seq:
+                    self._cond.wait(min(remaining, self.poll_interval))
+
+        conn = self.db.get_connection()
+        try:
+            oldest = conn.execute('SELECT MIN(seq) FROM order_events').fetchone()[0]
+            rows = conn.execute('''
+                SELECT seq, type, order_id, customer_id, order_number, status, total_amount
+                FROM order_events WHERE seq > ? ORDER BY seq LIMIT ?
+            ''', (after_seq, self.history)).fetchall()
+        finally:
+            conn.close()
+        if oldest is not None and oldest > after_seq + 1:
+            return None
+        return [{'id': str(row['seq']), **dict(row)} for row in rows]
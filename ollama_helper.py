@@ -1,21 +1,17 @@
-import sqlite3
 import requests
 import json
+from models.database import database
 
-# שליפת פריטים זמינים מהתפריט
+# שליפת פריטים זמינים מהתפריט (ממטמון התפריט)
 def get_menu_items():
-    conn = sqlite3.connect("roladin_restaurant.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT name, description, price, category FROM menu_items WHERE is_available=1")
-    rows = cursor.fetchall()
-    conn.close()
+    items = database.get_menu_items(available_only=True)
 
-    if not rows:
+    if not items:
         return "כרגע אין פריטים זמינים בתפריט."
 
     return "\n".join([
-        f"{name} ({category}) - {description}, ₪{price}"
-        for name, description, price, category in rows
+        f"{item['name']} ({item['category']}) - {item['description']}, ₪{item['price']}"
+        for item in items
     ])
 
 # בניית פרומפט
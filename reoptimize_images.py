@@ -0,0 +1,188 @@
+# reoptimize_images.py
+"""עיבוד מחדש של כל תמונות התפריט (למשל אחרי שינוי הגדרות איכות או גרסאות)
+
+1. התאמת שמות: פריט שהקובץ שלו לא קיים בתיקייה (croissant.jpg) מקבל את
+   קובץ המקור הקרוב ביותר בשם (croissant.png, ו-maffin.png ל-muffin.jpg).
+2. כל קובץ מקור שפריט מפנה אליו, או שתמונת המאגר של פריט נוצרה ממנו
+   (image_blobs.source_hash), מעובד ב-process_menu_image על מאגר תהליכים
+   בכל הליבות ומחובר לפריטים דרך ImageStore - בדיוק כמו העלאה.
+3. דוח גדלים וזמנים.
+
+קבצי המקור נשמרים (אלא אם --delete-originals), כך שהרצה חוזרת מעבדת תמיד
+מהמקור ולא מ-JPEG שכבר נדחס. לתמונות שהועלו דרך האפליקציה אין מקור בדיסק
+והן מדולגות.
+
+שימוש:
+    python reoptimize_images.py [--workers 8] [--dry-run] [--delete-originals]
+"""
+import argparse
+import difflib
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from image_processing import ImageStore, image_files, is_stored_image, parse_variants, process_menu_image, read_upload
+from models.database import db
+
+DEFAULT_FOLDER = 'static/images/menu-items'
+SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+
+def optimize_file(path, folder):
+    """עבודה בתהליך: בדיקה ועיבוד של קובץ מקור אחד - מחזיר נתונים לדוח"""
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        data, _, dimensions = read_upload(f)
+    return {
+        'result': process_menu_image(data, folder),
+        'source_hash': hashlib.sha256(data).hexdigest(),
+        'source_size': len(data),
+        'dimensions': dimensions,
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def list_sources(folder, items):
+    """קבצי מקור בתיקייה: תמונות שאינן מהמאגר ואינן גרסאות של תמונת פריט"""
+    derived = set()
+    for item in items:
+        derived.update(image_files(item['image_filename'], item['image_variants'])[1:])
+    return sorted(
+        name for name in os.listdir(folder)
+        if name.lower().endswith(SOURCE_EXTENSIONS) and not is_stored_image(name) and name not in derived
+    )
+
+
+def reconcile(items, sources):
+    """פריטים שהקובץ שלהם חסר -> {item_id: קובץ מקור עם השם הקרוב ביותר}"""
+    referenced = {item['image_filename'] for item in items}
+    by_stem = {os.path.splitext(name)[0].lower(): name for name in sources if name not in referenced}
+    matches = {}
+    for item in items:
+        filename = item['image_filename']
+        if not filename or is_stored_image(filename) or filename in sources:
+            continue
+        close = difflib.get_close_matches(os.path.splitext(filename)[0].lower(), list(by_stem), n=1, cutoff=0.8)
+        if close:
+            matches[item['id']] = by_stem.pop(close[0])
+    return matches
+
+
+def plan(database, folder, items, sources):
+    """{קובץ מקור: [item_id]} - לפי הפניה ישירה, או לפי source_hash של תמונת המאגר"""
+    by_image = {}
+    for item in items:
+        by_image.setdefault(item['image_filename'], []).append(item['id'])
+
+    jobs = {}
+    for name in sources:
+        item_ids = list(by_image.get(name, []))
+        with open(os.path.join(folder, name), 'rb') as f:
+            blob = database.get_image_blob_by_source(hashlib.sha256(f.read()).hexdigest())
+        if blob:
+            item_ids.extend(by_image.get(blob['filename'], []))
+        if item_ids:
+            jobs[name] = item_ids
+    return jobs
+
+
+def file_size(folder, filenames):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in filenames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='עיבוד מחדש של תמונות התפריט')
+    parser.add_argument('--database', default='roladin_restaurant.db')
+    parser.add_argument('--folder', default=DEFAULT_FOLDER)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--dry-run', action='store_true', help='רק התאמת שמות ותוכנית, בלי שינויים')
+    parser.add_argument('--delete-originals', action='store_true',
+                        help='מחיקת קבצי המקור אחרי העיבוד (הרצה חוזרת לא תמצא אותם)')
+    args = parser.parse_args()
+
+    database = db(args.database)
+    if database.get_schema_version() < len(database.MIGRATIONS):
+        if args.dry_run:
+            # --dry-run לא משנה כלום, גם לא את הסכמה
+            print('❌ מסד הנתונים דורש מיגרציות - הרץ בלי --dry-run או הפעל את האפליקציה קודם')
+            return
+        database.init_database()
+    store = ImageStore(database, args.folder)
+
+    items = database.get_menu_items(available_only=False)
+    for item in items:
+        item['image_variants'] = parse_variants(item['image_variants'])
+    sources = list_sources(args.folder, items)
+
+    for item_id, name in reconcile(items, sources).items():
+        item = next(item for item in items if item['id'] == item_id)
+        print(f"🔗 {item['name']}: {item['image_filename']} -> {name}")
+        if not args.dry_run:
+            database.update_menu_item_image(item_id, name)
+        item['image_filename'], item['image_variants'] = name, None
+
+    jobs = plan(database, args.folder, items, sources)
+    covered = {item_id for item_ids in jobs.values() for item_id in item_ids}
+    for item in items:
+        if item['image_filename'] and item['id'] not in covered:
+            print(f"⏭️ {item['name']}: {item['image_filename']} - אין קובץ מקור")
+    if args.dry_run or not jobs:
+        print(f"\n{len(jobs)} קבצי מקור לעיבוד")
+        return
+
+    previous = {item['id']: (item['image_filename'], item['image_variants']) for item in items}
+    rows = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(optimize_file, os.path.join(args.folder, name), args.folder): name
+            for name in jobs
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                report = future.result()
+            except ValueError as e:
+                print(f"❌ {name}: {e}")
+                continue
+            result = report['result']
+            if result is None:
+                print(f"❌ {name}: העיבוד נכשל")
+                continue
+
+            for item_id in jobs[name]:
+                store.attach(item_id, result['filename'], result['variants'], report['source_hash'],
+                             release_previous=args.delete_originals)
+                filename, variants = previous[item_id]
+                if not args.delete_originals and filename == name:
+                    # המקור נשמר; הגרסאות הישנות שנגזרו ממנו כבר לא בשימוש
+                    for derived in image_files(filename, variants)[1:]:
+                        if os.path.exists(os.path.join(args.folder, derived)):
+                            os.remove(os.path.join(args.folder, derived))
+            if args.delete_originals:
+                # מקור שכבר לא מופנה ישירות (הרצה חוזרת) - נמחק כאן
+                store.release(name)
+            rows.append((name, report, result))
+    elapsed = time.perf_counter() - started
+    removed = store.collect_garbage()
+
+    print(f"\n{'מקור':20} {'מידות':>11} {'מקור KB':>9} {'ראשי KB':>9} {'גרסאות KB':>10} {'זמן':>7}")
+    totals = [0, 0, 0, 0.0]
+    for name, report, result in sorted(rows):
+        width, height = report['dimensions']
+        source = report['source_size']
+        main_size = file_size(args.folder, [result['filename']])
+        variants = file_size(args.folder, image_files(result['filename'], result['variants'])[1:])
+        print(f"{name:20} {width:>5}x{height:<5} {source / 1024:9.1f} {main_size / 1024:9.1f} "
+              f"{variants / 1024:10.1f} {report['seconds']:6.2f}s")
+        for index, value in enumerate((source, main_size, variants, report['seconds'])):
+            totals[index] += value
+
+    print(f"{'סיכום':20} {'':11} {totals[0] / 1024:9.1f} {totals[1] / 1024:9.1f} {totals[2] / 1024:10.1f} {totals[3]:6.2f}s")
+    print(f"\n{len(rows)}/{len(jobs)} קבצים עובדו ב-{elapsed:.2f}s על {args.workers} תהליכים "
+          f"(זמן עבודה מצטבר {totals[3]:.2f}s), {removed} תמונות ישנות נמחקו מהמאגר")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,14 +10,43 @@ function initializeDashboard() {
     initializeModals();
     initializeImagePreview();
     refreshMenuStats();
+    connectOrderStream();
     
-    // Auto refresh every 30 seconds
+    // Auto refresh every 30 seconds; while the push channel is open orders are
+    // still polled, less often, in case an event is missed
     setInterval(() => {
         updateCurrentTime();
-        refreshOrders();
+        if (ordersPollDue()) {
+            refreshOrders();
+        }
     }, 30000);
 }
 
+// Push channel for order changes (Server-Sent Events)
+let orderStream = null;
+const STREAM_FALLBACK_POLL_MS = 120000;
+let lastOrdersRefresh = 0;
+
+function connectOrderStream() {
+    if (!window.EventSource) return;
+    
+    orderStream = new EventSource('/api/stream/orders');
+    orderStream.addEventListener('order_created', () => refreshOrders());
+    orderStream.addEventListener('order_status', () => refreshOrders());
+    orderStream.addEventListener('resync', () => {
+        ordersCursor = null;
+        refreshOrders();
+    });
+}
+
+function isOrderStreamOpen() {
+    return orderStream !== null && orderStream.readyState === EventSource.OPEN;
+}
+
+function ordersPollDue() {
+    return !isOrderStreamOpen() || Date.now() - lastOrdersRefresh >= STREAM_FALLBACK_POLL_MS;
+}
+
 // Time Management
 function updateCurrentTime() {
     const now = new Date();
@@ -118,20 +147,39 @@ function updateTimeAgo() {
     });
 }
 
+// Delta sync state: orders currently shown and the server cursor
+let dashboardOrders = [];
+let ordersCursor = null;
+const RECENT_ORDERS_LIMIT = 10;
+
 function refreshOrders() {
     const tableBody = document.getElementById('orders-table-body');
     if (!tableBody) return;
     
     // Show loading state
     tableBody.classList.add('loading');
+    lastOrdersRefresh = Date.now();
     
-    fetch('/api/orders/recent')
+    const url = ordersCursor
+        ? `/api/orders/recent?since=${encodeURIComponent(ordersCursor)}`
+        : '/api/orders/recent';
+    
+    fetch(url)
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                updateOrdersTable(data.orders);
-                showNotification('הזמנות עודכנו בהצלחה', 'success');
+                ordersCursor = data.cursor;
+                if (data.full) {
+                    dashboardOrders = data.orders;
+                    updateOrdersTable(dashboardOrders);
+                } else if (data.orders.length > 0) {
+                    mergeOrders(data.orders);
+                    updateOrdersTable(dashboardOrders);
+                    showNotification('הזמנות עודכנו בהצלחה', 'success');
+                }
             } else {
+                // Invalid cursor - fall back to a full reload next time
+                ordersCursor = null;
                 showNotification('שגיאה בטעינת הזמנות', 'error');
             }
         })
@@ -144,6 +192,15 @@ function refreshOrders() {
         });
 }
 
+function mergeOrders(changedOrders) {
+    const byId = new Map(dashboardOrders.map(order => [order.id, order]));
+    changedOrders.forEach(order => byId.set(order.id, order));
+    
+    dashboardOrders = Array.from(byId.values())
+        .sort((a, b) => (b.created_at.localeCompare(a.created_at)) || (b.id - a.id))
+        .slice(0, RECENT_ORDERS_LIMIT);
+}
+
 function updateOrdersTable(orders) {
     const tableBody = document.getElementById('orders-table-body');
     if (!tableBody) return;
@@ -602,7 +659,7 @@ function exportReport() {
             const a = document.createElement('a');
             a.style.display = 'none';
             a.href = url;
-            a.download = `roladin_report_${new Date().toISOString().split('T')[0]}.xlsx`;
+            a.download = `roladin_report_${new Date().toISOString().split('T')[0]}.csv`;
             document.body.appendChild(a);
             a.click();
             window.URL.revokeObjectURL(url);
@@ -681,7 +738,9 @@ let updateInterval;
 
 function startRealTimeUpdates() {
     updateInterval = setInterval(() => {
-        refreshOrders();
+        if (ordersPollDue()) {
+            refreshOrders();
+        }
         refreshMenuStats();
         updateTimeAgo();
     }, 60000); // Update every minute
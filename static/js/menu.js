@@ -446,15 +446,24 @@ function handleImageUpload(e) {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            showAlert('success', 'התמונה הועלתה בהצלחה!');
-            closeImageUpload();
-            
-            // עדכון התמונה בדף
-            updateItemImage(formData.get('item_id'), data.image_url);
-        } else {
+        if (!data.success) {
             showAlert('error', data.error || 'שגיאה בהעלאת התמונה');
+            return;
         }
+        
+        // התמונה מעובדת בשרת ברקע - ממתינים לסיום העבודה
+        submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> מעבד תמונה...';
+        return waitForImageJob(data).then(job => {
+            if (job.status === 'done') {
+                showAlert('success', 'התמונה הועלתה בהצלחה!');
+                closeImageUpload();
+                
+                // עדכון התמונה בדף
+                updateItemImage(job.item_id, job.image_url, job.srcset);
+            } else {
+                showAlert('error', job.error || 'שגיאה בעיבוד התמונה');
+            }
+        });
     })
     .catch(error => {
         console.error('Error:', error);
@@ -466,7 +475,21 @@ function handleImageUpload(e) {
     });
 }
 
-function updateItemImage(itemId, imageUrl) {
+function waitForImageJob(job, attempts = 60) {
+    // בדיקת מצב העבודה פעם בשנייה עד done / failed
+    if (job.status === 'done' || job.status === 'failed') {
+        return Promise.resolve(job);
+    }
+    if (attempts <= 0) {
+        return Promise.resolve({ status: 'failed', error: 'עיבוד התמונה נמשך זמן רב מדי' });
+    }
+    return new Promise(resolve => setTimeout(resolve, 1000))
+        .then(() => fetch(job.status_url))
+        .then(response => response.json())
+        .then(next => waitForImageJob(next.success ? next : { status: 'failed', error: next.error }, attempts - 1));
+}
+
+function updateItemImage(itemId, imageUrl, srcset) {
     const itemCard = document.querySelector(`[data-item-id="${itemId}"]`);
     if (!itemCard) return;
     
@@ -478,6 +501,7 @@ function updateItemImage(itemId, imageUrl) {
         const img = document.createElement('img');
         img.className = 'menu-item-image';
         img.src = imageUrl;
+        if (srcset) img.srcset = srcset;
         img.alt = itemCard.querySelector('.card-title').textContent;
         img.loading = 'lazy';
         
@@ -490,6 +514,14 @@ function updateItemImage(itemId, imageUrl) {
         // עדכון תמונה קיימת
         const img = imageContainer.querySelector('.menu-item-image');
         if (img) {
+            // מקורות WebP של התמונה הקודמת גוברים על src - מסירים אותם
+            const picture = img.closest('picture');
+            if (picture) {
+                picture.querySelectorAll('source').forEach(source => source.remove());
+            }
+            img.srcset = srcset || '';
+            img.removeAttribute('width');
+            img.removeAttribute('height');
             img.src = imageUrl;
         }
     }